@@ -0,0 +1,258 @@
+# 棋譜のバイナリアーカイブ（1 手 16 ビット、mmap で N 局目へ直接アクセス）
+#
+# ファイルの構成（数値はすべてリトルエンディアン）:
+#   ヘッダ   : マジック "CHGA", 版数 u16, 予約 u16, 局数 u32, オフセット表の位置 u64
+#   各局     : フラグ u8, 結果 u8, 手数 u16, [FEN の長さ u8 + FEN], 手 u16 × 手数
+#   オフセット表 : 各局の先頭位置 u64 × 局数（書き終えたときに末尾へ書き、ヘッダから指す）
+# 追記するときはオフセット表を読み込み、ファイルの末尾に局と新しい表を書いてから最後に
+# ヘッダを書き直す。途中で止まっても古いヘッダと表はそのまま残るので、それまでの局は読める
+# （古い表は使われない領域として残る。局を順に読むときもオフセット表をたどる）。
+# 手は 移動元マス(6) | 移動先マス(6) << 6 | 昇格駒(3) << 12。昇格駒は 0 がなし、
+# 1 以上が PROMOTION_CHOICES の添字 + 1。マスは row * 8 + col。
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+
+import pgn
+from core import PROMOTION_CHOICES, ChessBoard
+
+MAGIC = b"CHGA"
+VERSION = 1
+RESULTS = ("*", "1-0", "0-1", "1/2-1/2")
+
+_HEADER = struct.Struct("<4sHHIQ")
+_GAME = struct.Struct("<BBH")
+_FLAG_FEN = 1  # 初期配置以外から始まる（FEN を持つ）
+
+
+def encode_move(move):
+    """(from_row, from_col, to_row, to_col, 昇格駒) を 16 ビットの整数にする"""
+    from_row, from_col, to_row, to_col, promotion = move
+    code = (from_row * 8 + from_col) | (to_row * 8 + to_col) << 6
+    if promotion:
+        code |= (PROMOTION_CHOICES.index(promotion) + 1) << 12
+    return code
+
+
+def decode_move(code):
+    """encode_move の逆"""
+    from_sq = code & 63
+    to_sq = code >> 6 & 63
+    kind = code >> 12 & 7
+    return (from_sq >> 3, from_sq & 7, to_sq >> 3, to_sq & 7,
+            PROMOTION_CHOICES[kind - 1] if kind else None)
+
+
+_decoded = None
+
+
+def decoded_table():
+    """あり得る全ての符号から手のタプルを引ける表（読み出しを速くするため、初めて使うときに作る）"""
+    global _decoded
+    if _decoded is None:
+        _decoded = [decode_move(code) for code in range((len(PROMOTION_CHOICES) + 1) << 12)]
+    return _decoded
+
+
+class ArchiveWriter:
+    """局を順に追記してアーカイブを作る（close でオフセット表とヘッダを書く）
+
+    append が True で path があれば、既存のアーカイブの後ろに局を書き足す。
+    """
+
+    def __init__(self, path, append=False):
+        if append and os.path.exists(path):
+            self.file = open(path, "r+b")
+            magic, version, _, count, table = _HEADER.unpack(self.file.read(_HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                self.file.close()
+                raise ValueError(f"Not a game archive: {path}")
+            self.file.seek(table)
+            self.offsets = list(struct.unpack(f"<{count}Q", self.file.read(count * 8)))
+            # 古い表とヘッダは close まで書き換えず、末尾から書き足す
+            self.file.seek(0, os.SEEK_END)
+        else:
+            self.file = open(path, "wb")
+            self.file.write(_HEADER.pack(MAGIC, VERSION, 0, 0, 0))
+            self.offsets = []
+
+    def add(self, moves, start_fen=None, result="*"):
+        """手のタプルの列を 1 局として書く（書けない局なら何も書かずに ValueError）"""
+        flags = _FLAG_FEN if start_fen else 0
+        record = _GAME.pack(flags, RESULTS.index(result), len(moves))
+        if start_fen:
+            fen = start_fen.encode("ascii")
+            if len(fen) > 255:
+                raise ValueError(f"FEN too long: {start_fen}")
+            record += bytes([len(fen)]) + fen
+        record += struct.pack(f"<{len(moves)}H", *map(encode_move, moves))
+        offset = self.file.tell()
+        self.file.write(record)
+        self.offsets.append(offset)
+
+    def close(self):
+        if self.file.closed:
+            return
+        table = self.file.tell()
+        self.file.write(struct.pack(f"<{len(self.offsets)}Q", *self.offsets))
+        # 局と表がディスクに載ってから、ヘッダで新しい表を指す
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.seek(0)
+        self.file.write(_HEADER.pack(MAGIC, VERSION, 0, len(self.offsets), table))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Archive:
+    """mmap したアーカイブの読み出し（archive[n] で n 局目、for で全局を順に）"""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, self.count, table = _HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a game archive: {path}")
+        self.table = table
+        self.decoded = decoded_table()
+
+    def close(self):
+        self.data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def offset(self, index):
+        """index 局目の先頭位置（オフセット表から引く）"""
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        return struct.unpack_from("<Q", self.data, self.table + index * 8)[0]
+
+    def codes(self, index):
+        """index 局目を (開始 FEN または None, 結果, 16 ビットの手の列) で返す"""
+        return self._read(self.offset(index))[:3]
+
+    def __getitem__(self, index):
+        """index 局目を (開始 FEN または None, 結果, 手のタプルのリスト) で返す"""
+        start_fen, result, codes = self.codes(index)
+        return start_fen, result, [self.decoded[code] for code in codes]
+
+    def __iter__(self):
+        """先頭から順に全局を返す（オフセット表をまとめて読んでたどる）"""
+        decoded = self.decoded
+        for position in struct.unpack_from(f"<{self.count}Q", self.data, self.table):
+            start_fen, result, codes, _ = self._read(position)
+            yield start_fen, result, [decoded[code] for code in codes]
+
+    def _read(self, position):
+        """position から 1 局読み、(開始 FEN, 結果, 手の列, 次の局の位置) を返す"""
+        data = self.data
+        flags, result, plies = _GAME.unpack_from(data, position)
+        position += _GAME.size
+        start_fen = None
+        if flags & _FLAG_FEN:
+            length = data[position]
+            start_fen = data[position + 1:position + 1 + length].decode("ascii")
+            position += 1 + length
+        codes = struct.unpack_from(f"<{plies}H", data, position)
+        return start_fen, RESULTS[result], codes, position + plies * 2
+
+    def replay(self, index):
+        """index 局目を make_move で指し終えた ChessBoard を返す"""
+        start_fen, _, moves = self[index]
+        board = ChessBoard(start_fen)
+        for move in moves:
+            board.make_move(*move)
+        return board
+
+
+def pack(pgn_path, archive_path, append=False):
+    """PGN を指し直してアーカイブにする（append なら既存のアーカイブに書き足す）。
+    (書いた局数, 飛ばした局数) を返す"""
+    written = skipped = 0
+    with open(pgn_path, "rb") as stream, ArchiveWriter(archive_path, append) as writer:
+        for game in pgn.read_games(stream):
+            try:
+                _, moves = pgn.replay(game)
+            except (pgn.IllegalMoveError, KeyError, ValueError, IndexError) as error:
+                print(f"skip {game}: {error}", file=sys.stderr)
+                skipped += 1
+                continue
+            start_fen = game.headers.get("FEN")
+            try:
+                writer.add(moves, start_fen, game.result if game.result in RESULTS else "*")
+            except ValueError as error:
+                print(f"skip {game}: {error}", file=sys.stderr)
+                skipped += 1
+                continue
+            written += 1
+    return written, skipped
+
+
+def benchmark(path, replay=False):
+    """全局を順に読み（replay なら指し直しも）、局数・手数と速度を表示"""
+    start = time.perf_counter()
+    games = plies = 0
+    with Archive(path) as archive:
+        size = len(archive.data)
+        for start_fen, _, moves in archive:
+            games += 1
+            plies += len(moves)
+            if replay:
+                board = ChessBoard(start_fen)
+                for move in moves:
+                    board.make_move(*move)
+    elapsed = time.perf_counter() - start
+    print(f"{games} games  {plies} moves  {elapsed:.3f}s  {games / elapsed:,.0f} games/s  "
+          f"{size / elapsed / (1 << 20):,.1f} MB/s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="棋譜のバイナリアーカイブの作成と読み出し")
+    sub = parser.add_subparsers(dest="command", required=True)
+    make = sub.add_parser("pack", help="PGN からアーカイブを作る")
+    make.add_argument("pgn", help="PGN ファイル")
+    make.add_argument("archive", help="出力するアーカイブ")
+    make.add_argument("--append", action="store_true", help="既存のアーカイブの後ろに書き足す")
+    show = sub.add_parser("show", help="n 局目を PGN で表示")
+    show.add_argument("archive")
+    show.add_argument("index", type=int)
+    bench = sub.add_parser("bench", help="全局を順に読む速さを測る")
+    bench.add_argument("archive")
+    bench.add_argument("--replay", action="store_true", help="make_move で指し直しもする")
+    args = parser.parse_args(argv)
+
+    if args.command == "pack":
+        start = time.perf_counter()
+        written, skipped = pack(args.pgn, args.archive, args.append)
+        print(f"{written} games written, {skipped} skipped  {time.perf_counter() - start:.2f}s")
+    elif args.command == "show":
+        with Archive(args.archive) as archive:
+            try:
+                start_fen, result, moves = archive[args.index]
+            except IndexError:
+                print(f"game {args.index} out of range (the archive has {len(archive)} games, "
+                      f"numbered from 0)", file=sys.stderr)
+                return 1
+        sys.stdout.write(pgn.format_pgn({"Event": f"#{args.index}"}, moves, start_fen, result))
+    else:
+        benchmark(args.archive, args.replay)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
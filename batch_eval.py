@@ -0,0 +1,146 @@
+# 多数の局面をまとめて評価する（NumPy の配列演算）
+#
+# 局面を (N, 12, 64) の 0/1 の配列にする。面は 白の PAWN..KING（0-5）, 黒の PAWN..KING（6-11）
+# の順で、マスは row * 8 + col。各局面のビットボードの 12 個の u64 を並べた配列を
+# unpackbits で展開するので、Piece を 1 つずつ見る Python のループはない。
+# 評価値は evaluation.PIECE_SQUARE（駒の価値 + 位置評価）を (12, 64) の重みにして
+# 1 回の行列積で求め、evaluation.evaluate と同じ値（手番側から見た値）になる。
+import argparse
+import random
+import sys
+import time
+
+import bitboard
+import pgn
+from core import ChessBoard
+from evaluation import PIECE_SQUARE, evaluate
+
+PLANES = 12
+_PTYPES = range(bitboard.PAWN, bitboard.KING + 1)
+
+_weights = None
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise SystemExit("batch evaluation needs NumPy (pip install numpy)")
+    return numpy
+
+
+def weights():
+    """(12, 64) の重み（白の面は正、黒の面は負。白から見た値）"""
+    global _weights
+    if _weights is None:
+        np = _numpy()
+        _weights = np.array([[sign * value for value in PIECE_SQUARE[color][ptype]]
+                             for color, sign in ((bitboard.WHITE, 1), (bitboard.BLACK, -1))
+                             for ptype in _PTYPES], dtype=np.int32)
+    return _weights
+
+
+def to_planes(boards):
+    """ChessBoard の列を (N, 12, 64) の uint8 の配列と、白番かどうかの (N,) の配列にする"""
+    np = _numpy()
+    masks = []
+    white_to_move = []
+    for board in boards:
+        pieces = board.bitboards.pieces
+        masks.extend(pieces[bitboard.WHITE][1:])
+        masks.extend(pieces[bitboard.BLACK][1:])
+        white_to_move.append(board.current_turn.value == bitboard.WHITE)
+    count = len(white_to_move)
+    # u64 をリトルエンディアンのバイト列として見れば、下位ビット（マス 0）から順に展開できる
+    words = np.array(masks, dtype="<u8").view(np.uint8)
+    planes = np.unpackbits(words, bitorder="little").reshape(count, PLANES, 64)
+    return planes, np.array(white_to_move, dtype=bool)
+
+
+def evaluate_planes(planes, white_to_move):
+    """to_planes の結果から、手番側から見た評価値の (N,) の int32 配列を返す"""
+    np = _numpy()
+    # einsum は uint8 の配列を int32 に写さずに掛けるので、行列積（@）より速い
+    scores = np.einsum("np,p->n", planes.reshape(len(planes), PLANES * 64),
+                       weights().reshape(PLANES * 64))
+    return np.where(white_to_move, scores, -scores).astype(np.int32)
+
+
+def evaluate_batch(boards):
+    """ChessBoard の列をまとめて評価する（evaluation.evaluate と同じ値）"""
+    return evaluate_planes(*to_planes(boards))
+
+
+def random_positions(count, seed=0, max_plies=120):
+    """ランダムに指して現れた局面（1 局の全ての局面）を count 個返す（ベンチマーク用）"""
+    rng = random.Random(seed)
+    fens = []
+    while len(fens) < count:
+        board = ChessBoard()
+        for _ in range(max_plies):
+            moves = board.get_legal_moves()
+            if not moves or len(fens) >= count:
+                break
+            board.make_move(*rng.choice(moves))
+            fens.append(board.to_fen())
+    return [ChessBoard(fen) for fen in fens]
+
+
+def benchmark(sizes, seed=0):
+    """バッチの大きさごとに 1 局面ずつの evaluate と比べ、局面/秒を表示する"""
+    boards = random_positions(max(sizes), seed)
+    print(f"{'batch':>7} {'scalar/s':>12} {'batch/s':>12} {'eval only/s':>12} {'speedup':>8}")
+    for size in sizes:
+        chunk = boards[:size]
+        repeat = max(1, 20000 // size)
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            expected = [evaluate(board) for board in chunk]
+        scalar = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            planes, white_to_move = to_planes(chunk)
+            scores = evaluate_planes(planes, white_to_move)
+        batch = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            evaluate_planes(planes, white_to_move)
+        only = time.perf_counter() - start
+
+        if scores.tolist() != expected:
+            mismatch = sum(a != b for a, b in zip(scores.tolist(), expected))
+            raise SystemExit(f"batch evaluation differs from evaluate() in {mismatch} positions")
+        total = size * repeat
+        print(f"{size:>7} {total / scalar:>12,.0f} {total / batch:>12,.0f} {total / only:>12,.0f} "
+              f"{scalar / batch:>7.1f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="NumPy で多数の局面をまとめて評価する")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("eval", help="FEN のファイルの各局面を評価して表示")
+    run.add_argument("fens", help="1 行 1 局面の FEN / EPD ファイル")
+    run.add_argument("--batch", type=int, default=4096, help="一度に評価する局面数")
+    bench = sub.add_parser("bench", help="バッチの大きさごとの局面/秒を表示")
+    bench.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100, 1000, 10000])
+    bench.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        benchmark(args.sizes, args.seed)
+        return 0
+
+    with open(args.fens, encoding="utf-8") as stream:
+        fens = list(pgn.read_fens(stream))
+    for i in range(0, len(fens), args.batch):
+        chunk = fens[i:i + args.batch]
+        for fen, score in zip(chunk, evaluate_batch([ChessBoard(fen) for fen in chunk])):
+            print(f"{score} {fen}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
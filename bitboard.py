@@ -0,0 +1,407 @@
+# ビットボードによる局面表現
+# マス番号は row * 8 + col（row 0 が黒の初期配置側）で、ChessBoard の座標と対応する
+# 駒種・色の番号は PieceType / PieceColor の value と同じ値を使う
+
+PAWN, ROOK, KNIGHT, BISHOP, QUEEN, KING = range(1, 7)
+WHITE, BLACK = 1, 2
+
+FULL = (1 << 64) - 1
+FILE_A = 0x0101010101010101  # col 0
+FILE_B = FILE_A << 1
+FILE_G = FILE_A << 6
+FILE_H = FILE_A << 7  # col 7
+
+# 横方向のずれに応じて、盤の端を回り込んだマスを消すマスク
+_FILE_GUARD = {
+    -2: FULL & ~(FILE_G | FILE_H),
+    -1: FULL & ~FILE_H,
+    0: FULL,
+    1: FULL & ~FILE_A,
+    2: FULL & ~(FILE_A | FILE_B),
+}
+
+ROOK_DIRECTIONS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+BISHOP_DIRECTIONS = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
+QUEEN_DIRECTIONS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+KING_DIRECTIONS = QUEEN_DIRECTIONS
+
+# キャスリング権（キングとルークが初期位置で未移動）: (権利ビット, 色, キングのマス, ルークのマス)
+CASTLING_RIGHTS = [
+    (1, WHITE, 60, 63),  # 白キングサイド
+    (2, WHITE, 60, 56),  # 白クイーンサイド
+    (4, BLACK, 4, 7),  # 黒キングサイド
+    (8, BLACK, 4, 0),  # 黒クイーンサイド
+]
+CASTLING_SQUARES = (1 << 0) | (1 << 4) | (1 << 7) | (1 << 56) | (1 << 60) | (1 << 63)
+
+KNIGHT_OFFSETS = [(-2, -1), (-2, 1), (-1, -2), (-1, 2),
+                  (1, -2), (1, 2), (2, -1), (2, 1)]
+
+
+def shift(bb, dr, dc):
+    """ビットボード全体を (dr, dc) だけずらす（盤外に出たマスは消える）"""
+    delta = dr * 8 + dc
+    if delta >= 0:
+        bb = (bb << delta) & FULL
+    else:
+        bb >>= -delta
+    return bb & _FILE_GUARD[dc]
+
+
+def _ray(sq, dr, dc):
+    """sq から (dr, dc) 方向に盤端まで伸ばしたマス（sq 自身は含まない）"""
+    ray = 0
+    b = shift(1 << sq, dr, dc)
+    while b:
+        ray |= b
+        b = shift(b, dr, dc)
+    return ray
+
+
+def _step_targets(sq, offsets):
+    """sq から各オフセットへ 1 歩で行けるマス"""
+    targets = 0
+    for dr, dc in offsets:
+        targets |= shift(1 << sq, dr, dc)
+    return targets
+
+
+def slider_targets(sq, rays, occ):
+    """レイ表を使って、最初に当たる駒（その駒のマスを含む）までのマスを返す"""
+    targets = 0
+    for table, positive in rays:
+        ray = table[sq]
+        blockers = ray & occ
+        if blockers:
+            if positive:
+                blocker = (blockers & -blockers).bit_length() - 1
+            else:
+                blocker = blockers.bit_length() - 1
+            ray ^= table[blocker]  # 当たった駒より先を消す
+        targets |= ray
+    return targets
+
+
+# 起動時に一度だけ作る利き・レイの表（[マス] で引く）
+COORDS = [divmod(sq, 8) for sq in range(64)]
+KNIGHT_ATTACKS = [_step_targets(sq, KNIGHT_OFFSETS) for sq in range(64)]
+KING_ATTACKS = [_step_targets(sq, KING_DIRECTIONS) for sq in range(64)]
+PAWN_ATTACKS = [
+    [0] * 64,
+    [_step_targets(sq, [(-1, -1), (-1, 1)]) for sq in range(64)],  # 白（上へ進む）
+    [_step_targets(sq, [(1, -1), (1, 1)]) for sq in range(64)],  # 黒（下へ進む）
+]
+# 方向ごとのレイ表と、マス番号が増える向きか（最も近い駒を下位ビットから探すか）
+RAYS = {(dr, dc): ([_ray(sq, dr, dc) for sq in range(64)], dr * 8 + dc > 0)
+        for dr, dc in QUEEN_DIRECTIONS}
+ROOK_RAYS = [RAYS[d] for d in ROOK_DIRECTIONS]
+BISHOP_RAYS = [RAYS[d] for d in BISHOP_DIRECTIONS]
+QUEEN_RAYS = ROOK_RAYS + BISHOP_RAYS
+# 何もないときに届くマス（飛び駒が線上にいるかの下調べ用）
+ROOK_REACH = [slider_targets(sq, ROOK_RAYS, 0) for sq in range(64)]
+BISHOP_REACH = [slider_targets(sq, BISHOP_RAYS, 0) for sq in range(64)]
+
+# BETWEEN[a][b]: a と b の間のマス（同じ線上にないときは 0）
+# LINE[a][b]: a と b を通る盤端から盤端までの線（同じ線上にないときは 0）
+BETWEEN = [[0] * 64 for _ in range(64)]
+LINE = [[0] * 64 for _ in range(64)]
+for _sq in range(64):
+    for _dr, _dc in QUEEN_DIRECTIONS:
+        _line = _ray(_sq, _dr, _dc) | _ray(_sq, -_dr, -_dc) | (1 << _sq)
+        _between = 0
+        _b = shift(1 << _sq, _dr, _dc)
+        while _b:
+            _to = _b.bit_length() - 1
+            BETWEEN[_sq][_to] = _between
+            LINE[_sq][_to] = _line
+            _between |= _b
+            _b = shift(_b, _dr, _dc)
+
+
+def squares_of(bb):
+    """ビットが立っているマス番号のリスト"""
+    result = []
+    while bb:
+        low = bb & -bb
+        result.append(low.bit_length() - 1)
+        bb ^= low
+    return result
+
+
+def squares(bb):
+    """ビットが立っているマスを (row, col) のリストで返す"""
+    result = []
+    while bb:
+        low = bb & -bb
+        result.append(COORDS[low.bit_length() - 1])
+        bb ^= low
+    return result
+
+
+def other(color):
+    """相手の色番号"""
+    return BLACK if color == WHITE else WHITE
+
+
+class Bitboards:
+    """駒種・色ごとの 64 ビット占有マスクで局面を保持する"""
+
+    def __init__(self):
+        self.pieces = [[0] * 7 for _ in range(3)]  # [色][駒種]
+        self.occupied = [0, 0, 0]  # [全体, 白, 黒]
+        self.unmoved = 0  # 一度も動いていない駒（キャスリング判定用）
+        # マスごとの、そこにある駒の利き（put / remove で差分更新する）
+        self.attacks = [0] * 64
+        # 色ごとの利きの合計（attacks が変わったら None にして、次に使うときに作る）
+        self._side_attacks = [0, 0, 0]
+
+    def copy(self):
+        """同じ局面の Bitboards（作り直さずにリストを写す）"""
+        other = Bitboards.__new__(Bitboards)
+        other.pieces = [row[:] for row in self.pieces]
+        other.occupied = self.occupied[:]
+        other.unmoved = self.unmoved
+        other.attacks = self.attacks[:]
+        other._side_attacks = self._side_attacks[:]
+        return other
+
+    def put(self, sq, color, ptype, moved=True):
+        """マスに駒を置く"""
+        bit = 1 << sq
+        self.pieces[color][ptype] |= bit
+        self.occupied[color] |= bit
+        self.occupied[0] |= bit
+        if moved:
+            self.unmoved &= ~bit
+        else:
+            self.unmoved |= bit
+        self._update_attacks(sq, color, ptype)
+
+    def remove(self, sq, color, ptype):
+        """マスから駒を取り除く"""
+        mask = ~(1 << sq)
+        self.pieces[color][ptype] &= mask
+        self.occupied[color] &= mask
+        self.occupied[0] &= mask
+        self.unmoved &= mask
+        self._update_attacks(sq, color, None)
+
+    def _update_attacks(self, sq, color, ptype):
+        """sq の駒と、sq を通る線上の飛び駒の利きだけを計算し直す"""
+        attacks = self.attacks
+        occ = self.occupied[0]
+        if ptype is None:
+            attacks[sq] = 0
+        elif ptype == PAWN:
+            attacks[sq] = PAWN_ATTACKS[color][sq]
+        elif ptype == KNIGHT:
+            attacks[sq] = KNIGHT_ATTACKS[sq]
+        elif ptype == KING:
+            attacks[sq] = KING_ATTACKS[sq]
+        elif ptype == ROOK:
+            attacks[sq] = slider_targets(sq, ROOK_RAYS, occ)
+        elif ptype == BISHOP:
+            attacks[sq] = slider_targets(sq, BISHOP_RAYS, occ)
+        else:
+            attacks[sq] = slider_targets(sq, QUEEN_RAYS, occ)
+
+        # sq が塞がった／空いたことで利きが伸び縮みする飛び駒
+        white, black = self.pieces[WHITE], self.pieces[BLACK]
+        queens = white[QUEEN] | black[QUEEN]
+        rooks = white[ROOK] | black[ROOK] | queens
+        bishops = white[BISHOP] | black[BISHOP] | queens
+        sliders = 0
+        if ROOK_REACH[sq] & rooks:
+            sliders = slider_targets(sq, ROOK_RAYS, occ) & rooks
+        if BISHOP_REACH[sq] & bishops:
+            sliders |= slider_targets(sq, BISHOP_RAYS, occ) & bishops
+        while sliders:
+            low = sliders & -sliders
+            sliders ^= low
+            s = low.bit_length() - 1
+            if low & queens:
+                attacks[s] = slider_targets(s, QUEEN_RAYS, occ)
+            elif low & rooks:
+                attacks[s] = slider_targets(s, ROOK_RAYS, occ)
+            else:
+                attacks[s] = slider_targets(s, BISHOP_RAYS, occ)
+        self._side_attacks[WHITE] = self._side_attacks[BLACK] = None
+
+    def attack_map(self, color):
+        """color の駒が利いているマス全体"""
+        side = self._side_attacks[color]
+        if side is None:
+            side = 0
+            attacks = self.attacks
+            pieces = self.occupied[color]
+            while pieces:
+                low = pieces & -pieces
+                pieces ^= low
+                side |= attacks[low.bit_length() - 1]
+            self._side_attacks[color] = side
+        return side
+
+    def attackers_to(self, sq, color, occ):
+        """占有 occ のとき sq に利いている color の駒"""
+        p = self.pieces[color]
+        return ((KNIGHT_ATTACKS[sq] & p[KNIGHT]) | (KING_ATTACKS[sq] & p[KING]) |
+                (PAWN_ATTACKS[other(color)][sq] & p[PAWN]) |
+                (slider_targets(sq, ROOK_RAYS, occ) & (p[ROOK] | p[QUEEN])) |
+                (slider_targets(sq, BISHOP_RAYS, occ) & (p[BISHOP] | p[QUEEN])))
+
+    def in_check(self, color):
+        """color のキングに相手の駒が利いているか"""
+        return bool(self.pieces[color][KING] & self.attack_map(other(color)))
+
+    def pinned(self, king_sq, color):
+        """color のキングにピンされている color の駒"""
+        enemy = self.pieces[other(color)]
+        occ = self.occupied[0]
+        own = self.occupied[color]
+        # 味方の駒を透かしてキングから見える相手の飛び駒がピンの候補
+        through = self.occupied[other(color)]
+        candidates = ((slider_targets(king_sq, ROOK_RAYS, through) & (enemy[ROOK] | enemy[QUEEN])) |
+                      (slider_targets(king_sq, BISHOP_RAYS, through) & (enemy[BISHOP] | enemy[QUEEN])))
+        pinned = 0
+        while candidates:
+            low = candidates & -candidates
+            candidates ^= low
+            between = BETWEEN[king_sq][low.bit_length() - 1] & occ
+            if between and not between & (between - 1) and between & own:
+                pinned |= between
+        return pinned
+
+    def legal_targets(self, color, ep_square=None):
+        """手番 color の合法手を (マス, 駒種, 移動先ビットボード) のリストで返す
+
+        利きの表でキングの移動先とキャスリングの通過マスを調べ、
+        ピンと王手（合い駒・王手駒を取る手）で他の駒の移動先を絞る。
+        """
+        kings = self.pieces[color][KING]
+        if not kings:
+            return []
+        king_sq = kings.bit_length() - 1
+        enemy = other(color)
+        own = self.occupied[color]
+        occ = self.occupied[0]
+        enemy_map = self.attack_map(enemy)
+        in_check = kings & enemy_map
+
+        # キング: 相手の利きのないマスへ。飛び駒の王手ならその線上の後ろにも逃げられない
+        king_targets = KING_ATTACKS[king_sq] & ~own & ~enemy_map
+        checkers = 0
+        if in_check:
+            checkers = self.attackers_to(king_sq, enemy, occ)
+            sliders = checkers & ~(self.pieces[enemy][KNIGHT] | self.pieces[enemy][PAWN])
+            while sliders:
+                low = sliders & -sliders
+                sliders ^= low
+                king_targets &= ~(LINE[king_sq][low.bit_length() - 1] & ~low)
+        else:
+            # キャスリング: 通過するマスと移動先に相手の利きがないこと
+            for target in squares_of(self._castling_targets(king_sq, color, occ)):
+                passing = (king_sq + target) // 2
+                if not enemy_map & ((1 << passing) | (1 << target)):
+                    king_targets |= 1 << target
+        result = [(king_sq, KING, king_targets)]
+        if checkers & (checkers - 1):
+            return result  # 両王手はキングしか動けない
+
+        # 王手されていれば、王手駒を取るか間に入る手だけ
+        evasion = FULL
+        if checkers:
+            evasion = checkers | BETWEEN[king_sq][checkers.bit_length() - 1]
+        pinned = self.pinned(king_sq, color)
+        pieces = self.pieces[color]
+        for ptype in (PAWN, KNIGHT, BISHOP, ROOK, QUEEN):
+            mask = pieces[ptype]
+            while mask:
+                low = mask & -mask
+                mask ^= low
+                sq = low.bit_length() - 1
+                targets = self.targets(sq, color, ptype) & evasion
+                if low & pinned:
+                    targets &= LINE[king_sq][sq]
+                if ptype == PAWN and ep_square is not None and PAWN_ATTACKS[color][sq] >> ep_square & 1:
+                    if self._ep_is_legal(sq, ep_square, king_sq, color):
+                        targets |= 1 << ep_square
+                if targets:
+                    result.append((sq, ptype, targets))
+        return result
+
+    def _ep_is_legal(self, sq, ep_square, king_sq, color):
+        """アンパッサンで自分のキングに利きが通らないか（取った後の占有で確かめる）"""
+        captured = (sq & ~7) | (ep_square & 7)  # 取られるポーンは移動元と同じ段
+        occ = (self.occupied[0] & ~(1 << sq) & ~(1 << captured)) | (1 << ep_square)
+        attackers = self.attackers_to(king_sq, other(color), occ) & ~(1 << captured)
+        return not attackers
+
+    def piece_at(self, sq):
+        """マスの駒を (色, 駒種) で返す。空きマスなら None"""
+        bit = 1 << sq
+        if not self.occupied[0] & bit:
+            return None
+        color = WHITE if self.occupied[WHITE] & bit else BLACK
+        for ptype in range(PAWN, KING + 1):
+            if self.pieces[color][ptype] & bit:
+                return color, ptype
+        return None
+
+    def castling_rights(self):
+        """未移動のキング・ルークから求めたキャスリング権（4 ビット）"""
+        rights = 0
+        for flag, color, king_sq, rook_sq in CASTLING_RIGHTS:
+            if ((self.unmoved & self.pieces[color][KING]) >> king_sq & 1 and
+                    (self.unmoved & self.pieces[color][ROOK]) >> rook_sq & 1):
+                rights |= flag
+        return rights
+
+    def targets(self, sq, color, ptype, ep_square=None):
+        """sq にある駒の移動先をビットボードで返す"""
+        own = self.occupied[color]
+        occ = self.occupied[0]
+
+        if ptype == PAWN:
+            return self._pawn_targets(sq, color, occ, ep_square)
+        if ptype == KNIGHT:
+            return KNIGHT_ATTACKS[sq] & ~own
+        if ptype == KING:
+            return (KING_ATTACKS[sq] & ~own) | self._castling_targets(sq, color, occ)
+        if ptype == ROOK:
+            return slider_targets(sq, ROOK_RAYS, occ) & ~own
+        if ptype == BISHOP:
+            return slider_targets(sq, BISHOP_RAYS, occ) & ~own
+        return slider_targets(sq, QUEEN_RAYS, occ) & ~own
+
+    def _pawn_targets(self, sq, color, occ, ep_square):
+        """ポーンの移動先"""
+        if color == WHITE:
+            targets = (1 << sq >> 8) & ~occ
+            if targets and sq >> 3 == 6:  # 初期位置（row 6）から 2 マス
+                targets |= (targets >> 8) & ~occ
+        else:
+            targets = (1 << sq << 8) & FULL & ~occ
+            if targets and sq >> 3 == 1:  # 初期位置（row 1）から 2 マス
+                targets |= (targets << 8) & ~occ
+
+        attacks = PAWN_ATTACKS[color][sq]
+        targets |= attacks & self.occupied[other(color)]
+        # アンパッサン: 対象マスが斜め前にあれば取れる
+        if ep_square is not None:
+            targets |= attacks & (1 << ep_square)
+        return targets
+
+    def _castling_targets(self, sq, color, occ):
+        """キャスリングでキングが移動できるマス"""
+        if not self.unmoved >> sq & 1:
+            return 0
+        base = sq - sq % 8
+        rooks = self.pieces[color][ROOK] & self.unmoved
+        targets = 0
+        # キングサイド（右）
+        if rooks & (1 << (base + 7)) and not occ & (0b01100000 << base):
+            targets |= 1 << (base + 6)
+        # クイーンサイド（左）
+        if rooks & (1 << base) and not occ & (0b00001110 << base):
+            targets |= 1 << (base + 2)
+        return targets
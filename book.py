@@ -0,0 +1,178 @@
+# 序盤定跡（局面キーで引く、ソート済みのディスク上の表）
+#
+# ファイルの構成（リトルエンディアン）:
+#   ヘッダ   : マジック "CHBK", 版数 u16, 予約 u16, レコード数 u64
+#   レコード : 局面の Zobrist キー u64, 手 u16（archive.encode_move）, 重み u16
+# レコードはキーの昇順（同じキーの中では重みの降順）に並べる。読むときは mmap して
+# 二分探索するので、定跡全体をメモリに読み込まない。
+import argparse
+import mmap
+import random
+import struct
+import sys
+import time
+from collections import defaultdict
+
+import pgn
+from archive import Archive, decode_move, encode_move
+from core import ChessBoard, PieceColor, move_name
+
+MAGIC = b"CHBK"
+VERSION = 1
+
+_HEADER = struct.Struct("<4sHHQ")
+_RECORD = struct.Struct("<QHH")
+_KEY = struct.Struct("<Q")
+_MAX_WEIGHT = 0xFFFF
+
+# 指した側から見た結果ごとの重み（勝ち 2, 引き分け・不明 1, 負け 0）
+_RESULT_WEIGHTS = {
+    "1-0": {PieceColor.WHITE: 2, PieceColor.BLACK: 0},
+    "0-1": {PieceColor.WHITE: 0, PieceColor.BLACK: 2},
+}
+
+
+class OpeningBook:
+    """mmap した定跡ファイルを二分探索で引く"""
+
+    def __init__(self, path, seed=None):
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, self.count = _HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not an opening book: {path}")
+        self.rng = random.Random(seed)
+
+    def close(self):
+        self.data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def _key_at(self, index):
+        return _KEY.unpack_from(self.data, _HEADER.size + index * _RECORD.size)[0]
+
+    def probe(self, key):
+        """key の局面の (16 ビットの手, 重み) のリストを重みの降順で返す"""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        entries = []
+        position = _HEADER.size + lo * _RECORD.size
+        for _ in range(lo, self.count):
+            record_key, code, weight = _RECORD.unpack_from(self.data, position)
+            if record_key != key:
+                break
+            entries.append((code, weight))
+            position += _RECORD.size
+        return entries
+
+    def moves(self, board):
+        """board で指せる定跡手の (手のタプル, 重み) のリスト（キーの衝突に備えて合法手に限る）"""
+        entries = self.probe(board.zobrist_key)
+        if not entries:
+            return []
+        legal = set(board.get_legal_moves())
+        return [(decode_move(code), weight) for code, weight in entries
+                if decode_move(code) in legal]
+
+    def choose(self, board):
+        """重みに比例した確率で定跡手を 1 つ選ぶ（定跡になければ None。重み 0 の手は選ばない）"""
+        entries = [(move, weight) for move, weight in self.moves(board) if weight > 0]
+        if not entries:
+            return None
+        moves, weights = zip(*entries)
+        return self.rng.choices(moves, weights)[0]
+
+
+def _games(path):
+    """PGN またはアーカイブ（.chga）から (開始局面の ChessBoard, 結果, 手のイテレータ) を順に返す
+
+    PGN の手は board に指した後で次の手を読む（SAN は直前の局面で解釈する）。
+    """
+    def san_moves(board, game):
+        for san in game.moves:
+            yield pgn.parse_san(board, san)
+
+    if path.lower().endswith(".chga"):
+        with Archive(path) as archive:
+            for start_fen, result, moves in archive:
+                yield ChessBoard(start_fen), result, iter(moves)
+        return
+    with open(path, "rb") as stream:
+        for game in pgn.read_games(stream):
+            try:
+                board = ChessBoard(game.headers.get("FEN"))
+            except (KeyError, ValueError, IndexError):
+                continue  # 読めない FEN タグの局は使わない
+            yield board, game.result, san_moves(board, game)
+
+
+def build(sources, path, plies=16, min_weight=1):
+    """棋譜ファイル群の最初の plies 手から定跡を作る。(局数, レコード数) を返す"""
+    weights = defaultdict(int)
+    games = 0
+    for source in sources:
+        for board, result, moves in _games(source):
+            games += 1
+            by_color = _RESULT_WEIGHTS.get(result)
+            try:
+                for _, move in zip(range(plies), moves):
+                    weight = by_color[board.current_turn] if by_color else 1
+                    weights[board.zobrist_key, encode_move(move)] += weight
+                    board.make_move(*move)
+            except pgn.IllegalMoveError:
+                pass  # 不正な手より後は使わない
+
+    records = sorted(((key, code, min(weight, _MAX_WEIGHT))
+                      for (key, code), weight in weights.items() if weight >= min_weight),
+                     key=lambda record: (record[0], -record[2]))
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, 0, len(records)))
+        for record in records:
+            f.write(_RECORD.pack(*record))
+    return games, len(records)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="序盤定跡の作成と確認")
+    sub = parser.add_subparsers(dest="command", required=True)
+    make = sub.add_parser("build", help="PGN / アーカイブから定跡を作る")
+    make.add_argument("book", help="出力する定跡ファイル")
+    make.add_argument("sources", nargs="+", help="PGN または .chga のファイル")
+    make.add_argument("--plies", type=int, default=16, help="各局の最初の何手までを使うか")
+    make.add_argument("--min-weight", type=int, default=1, help="これより軽い手は捨てる")
+    show = sub.add_parser("probe", help="局面の定跡手を表示")
+    show.add_argument("book")
+    show.add_argument("--fen", help="調べる局面（省略時は初期配置）")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        start = time.perf_counter()
+        games, records = build(args.sources, args.book, args.plies, args.min_weight)
+        print(f"{games} games  {records} records  {time.perf_counter() - start:.2f}s")
+        return 0
+
+    with OpeningBook(args.book) as book:
+        board = ChessBoard(args.fen)
+        start = time.perf_counter()
+        entries = book.moves(board)
+        elapsed = time.perf_counter() - start
+    for move, weight in entries:
+        print(f"{move_name(move)} {weight}")
+    print(f"{len(entries)} moves  {elapsed * 1e6:.0f} us")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
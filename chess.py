@@ -1,9 +1,16 @@
+# ウィンドウ版のチェス（pygame の描画と入力）
+#
+# ルール（Piece・ChessBoard など）は core.py にあり、ここから同じ名前で使える。
+# pygame の初期化・フォント・駒の画像は ChessGame を作ったときに必要な分だけ用意する。
+import argparse
+import functools
+import os
 import pygame
 import sys
-from enum import Enum
+import time
 
-# 初期化
-pygame.init()
+from core import (FEN_PIECES, PROMOTION_CHOICES, ChessBoard, Piece, PieceColor, PieceType,
+                  move_name)
 
 # 定数
 BOARD_SIZE = 8
@@ -19,348 +26,204 @@ LIGHT_BROWN = (240, 217, 181)
 DARK_BROWN = (181, 136, 99)
 HIGHLIGHT_COLOR = (255, 255, 0, 128)
 SELECTED_COLOR = (0, 255, 0, 128)
+HINT_COLOR = (0, 128, 255, 96)
 RED = (255, 0, 0)
 BLUE = (0, 0, 255)
 
-class PieceType(Enum):
-    PAWN = 1
-    ROOK = 2
-    KNIGHT = 3
-    BISHOP = 4
-    QUEEN = 5
-    KING = 6
-
-class PieceColor(Enum):
-    WHITE = 1
-    BLACK = 2
-
-class Piece:
-    def __init__(self, piece_type, color, row, col):
-        self.type = piece_type
-        self.color = color
-        self.row = row
-        self.col = col
-        self.has_moved = False
-        
-    def get_possible_moves(self, board):
-        """駒の可能な動きを取得"""
-        moves = []
-        if self.type == PieceType.BISHOP:
-            # 斜め4方向をチェック（左上, 右上, 左下, 右下）
-            directions = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
-            for dr, dc in directions:
-                r, c = self.row + dr, self.col + dc
-                while 0 <= r < 8 and 0 <= c < 8:
-                    target = board.get_piece(r, c)
-                    if target is None:
-                        moves.append((r, c))  # 空きマス
-                    elif target.color != self.color:
-                        moves.append((r, c))  # 敵の駒を取る
-                        break  # 敵の駒の先には進めない
-                    else:
-                        break  # 味方の駒で止まる
-                    r += dr
-                    c += dc
-        elif self.type == PieceType.PAWN:
-            direction = -1 if self.color == PieceColor.WHITE else 1
-            start_row = 6 if self.color == PieceColor.WHITE else 1
-
-            if board.get_piece(self.row + direction, self.col) is None:
-                moves.append((self.row + direction, self.col))
-
-                if self.row == start_row and board.get_piece(self.row + 2 * direction, self.col) is None:
-                    moves.append((self.row + 2 * direction, self.col))
-
-            for dx in [-1, 1]:
-                new_row = self.row + direction
-                new_col = self.col + dx
-                if 0 <= new_col < 8 and 0 <= new_row < 8:
-                    target = board.get_piece(new_row, new_col)
-                    if target and target.color != self.color:
-                        moves.append((new_row, new_col))
-
-            if board.en_passant_target:
-                target_row, target_col = board.en_passant_target
-                if abs(target_col - self.col) == 1 and target_row == self.row + direction:
-                    moves.append((target_row, target_col))
-
-        elif self.type == PieceType.KING:
-            directions_k = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0),  (1, 1)]
-            for dr, dc in directions_k:
-                new_row = self.row + dr
-                new_col = self.col + dc
-                if 0 <= new_row < 8 and 0 <= new_col < 8:
-                    target_piece = board.get_piece(new_row, new_col)
-                    if not target_piece or target_piece.color != self.color:
-                        moves.append((new_row, new_col))
-            if not self.has_moved:
-                row = self.row
-                # キングサイド（右）
-                rook = board.get_piece(row, 7)
-                if rook and rook.type == PieceType.ROOK and not rook.has_moved:
-                    if board.get_piece(row, 5) is None and board.get_piece(row, 6) is None:
-                        moves.append((row, 6))  # キャスリング先（キング）
-
-                # クイーンサイド（左）
-                rook = board.get_piece(row, 0)
-                if rook and rook.type == PieceType.ROOK and not rook.has_moved:
-                    if (board.get_piece(row, 1) is None and
-                        board.get_piece(row, 2) is None and
-                        board.get_piece(row, 3) is None):
-                        moves.append((row, 2))  # キャスリング先（キング）
-
-
-
-        elif self.type == PieceType.KNIGHT:
-            # ナイトの動き：8方向へのL字移動
-            knight_moves = [
-                (-2, -1), (-2, +1),
-                (-1, -2), (-1, +2),
-                (+1, -2), (+1, +2),
-                (+2, -1), (+2, +1)
-            ]
-            for dr, dc in knight_moves:
-                new_row = self.row + dr
-                new_col = self.col + dc
-                if board.is_valid_move(self.row, self.col, new_row, new_col):
-                    moves.append((new_row, new_col))
-
-        elif self.type == PieceType.ROOK:
-            directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
-            for dr, dc in directions:
-                r, c = self.row + dr, self.col + dc
-                while 0 <= r < 8 and 0 <= c < 8:
-                    target_piece = board.get_piece(r, c)
-                    if target_piece is None:
-                        moves.append((r, c))
-                    elif target_piece.color != self.color:
-                        moves.append((r, c))
-                        break
-                    else:
-                        break
-                    r += dr
-                    c += dc
-        elif self.type == PieceType.QUEEN:
-            directions = [(-1, 0), (1, 0), (0, -1), (0, 1),
-                        (-1, -1), (-1, 1), (1, -1), (1, 1)]
-            for dr, dc in directions:
-                r, c = self.row + dr, self.col + dc
-                while 0 <= r < 8 and 0 <= c < 8:
-                    target_piece = board.get_piece(r, c)
-                    if target_piece is None:
-                        moves.append((r, c))
-                    elif target_piece.color != self.color:
-                        moves.append((r, c))
-                        break
-                    else:
-                        break
-                    r += dr
-                    c += dc
-        # else:
-        #     # 暫定的に全マス移動可能（is_valid_moveで敵味方チェックあり）
-        #     for row in range(8):
-        #         for col in range(8):
-        #             if board.is_valid_move(self.row, self.col, row, col):
-        #                 moves.append((row, col))
-        #     return moves
-
-        # for dr, dc in directions:
-        #     r, c = self.row + dr, self.col + dc
-        #     while 0 <= r < 8 and 0 <= c < 8:
-        #         target_piece = board.get_piece(r, c)
-        #         if target_piece is None:
-        #             moves.append((r, c))
-        #         elif target_piece.color != self.color:
-        #             moves.append((r, c))
-        #             break
-        #         else:
-        #             break
-        #         r += dr
-        #         c += dc
-
-        return moves
-
-    
-    def move(self, new_row, new_col):
-        """駒を移動"""
-        self.row = new_row
-        self.col = new_col
-        self.has_moved = True
-    
-    def __str__(self):
-        symbols = {
-            PieceType.PAWN: "P",
-            PieceType.ROOK: "R",
-            PieceType.KNIGHT: "N",
-            PieceType.BISHOP: "B",
-            PieceType.QUEEN: "Q",
-            PieceType.KING: "K"
-        }
-        return symbols[self.type]
-    
-    def get_display_color(self):
-        """駒の表示色を取得"""
-        return BLACK if self.color == PieceColor.BLACK else WHITE
-
-class ChessBoard:
-    def __init__(self):
-        self.board = [[None for _ in range(8)] for _ in range(8)]
-        self.current_turn = PieceColor.WHITE
-        self.selected_piece = None
-        self.selected_pos = None
-        self.winner = None
-        self.possible_moves = []
-        
-        self.en_passant_target = None
-        self.promotion_pending = False
-        self.promotion_piece = None
-
-        self.setup_initial_position()
-    
-    def setup_initial_position(self):
-        """初期配置を設定"""
-        # 黒の駒
-        piece_order = [PieceType.ROOK, PieceType.KNIGHT, PieceType.BISHOP, PieceType.QUEEN,
-                      PieceType.KING, PieceType.BISHOP, PieceType.KNIGHT, PieceType.ROOK]
-        
-        for col in range(8):
-            # 黒の駒
-            self.board[0][col] = Piece(piece_order[col], PieceColor.BLACK, 0, col)
-            self.board[1][col] = Piece(PieceType.PAWN, PieceColor.BLACK, 1, col)
-            
-            # 白の駒
-            self.board[7][col] = Piece(piece_order[col], PieceColor.WHITE, 7, col)
-            self.board[6][col] = Piece(PieceType.PAWN, PieceColor.WHITE, 6, col)
-    
-    def get_piece(self, row, col):
-        """指定位置の駒を取得"""
-        if 0 <= row < 8 and 0 <= col < 8:
-            return self.board[row][col]
-        return None
-    
-    def set_piece(self, row, col, piece):
-        """指定位置に駒を配置"""
-        if 0 <= row < 8 and 0 <= col < 8:
-            self.board[row][col] = piece
-    
-    def is_valid_move(self, from_row, from_col, to_row, to_col):
-        """移動が有効かチェック（基本的な範囲チェック）"""
-        if not (0 <= to_row < 8 and 0 <= to_col < 8):
-            return False
-        
-        piece = self.get_piece(from_row, from_col)
-        if not piece:
-            return False
-        
-        target_piece = self.get_piece(to_row, to_col)
-        if target_piece and target_piece.color == piece.color:
-            return False
-        
-        return True
-    
-    def make_move(self, from_row, from_col, to_row, to_col):
-        piece = self.get_piece(from_row, from_col)
-        if not piece or piece.color != self.current_turn:
-            return False
-
-        is_en_passant = False
-        if piece.type == PieceType.PAWN and self.en_passant_target == (to_row, to_col):
-            is_en_passant = True
-
-        if not self.is_valid_move(from_row, from_col, to_row, to_col):
-            return False
-
-        #target_pieceを定義
-        target_piece = self.get_piece(to_row, to_col)
-        
-        # キングが取られたら勝敗を設定
-        if target_piece and target_piece.type == PieceType.KING:
-            self.set_piece(to_row, to_col, piece)
-            self.set_piece(from_row, from_col, None)
-            piece.move(to_row, to_col)
-            self.winner = piece.color  # 勝った側の色
-            return True
-        
-
-        if is_en_passant:
-            self.set_piece(from_row, to_col, None)
-
-        self.set_piece(to_row, to_col, piece)
-        self.set_piece(from_row, from_col, None)
-        piece.move(to_row, to_col)
+# 情報欄のフォントの候補（日本語対応。どれもなければ pygame の既定のフォント）
+FONT_FILES = ["msgothic.ttc",  # Windows
+              "NotoSansCJK-Regular.ttc"]  # Linux
+
+# 駒の画像のキャッシュ（12 種を横に並べた RGBA の生データ）。描き方を変えたら版数を上げる
+GLYPH_VERSION = 1
+GLYPH_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache",
+                           f"pieces_{SQUARE_SIZE}_v{GLYPH_VERSION}.rgba")
+GLYPH_KEYS = [(p_type, color) for p_type in PieceType for color in PieceColor]
+
+
+def load_font(size):
+    """FONT_FILES の最初にあるフォントを開く"""
+    for name in FONT_FILES:
+        if os.path.exists(name):
+            return pygame.font.Font(name, size)
+    return pygame.font.Font(None, size)
+
+
+def render_glyphs():
+    """駒の画像を 12 種横に並べた Surface を描く"""
+    font = pygame.font.Font(None, 60)
+    atlas = pygame.Surface((SQUARE_SIZE * len(GLYPH_KEYS), SQUARE_SIZE), pygame.SRCALPHA)
+    for i, (p_type, color) in enumerate(GLYPH_KEYS):
+        piece = Piece(p_type, color, 0, 0)
+        text_color = piece.get_display_color()
+        # 背景色を設定（見やすくするため）
+        bg_color = WHITE if text_color == BLACK else BLACK
+        center = (i * SQUARE_SIZE + SQUARE_SIZE // 2, SQUARE_SIZE // 2)
+        # 背景の円を描画
+        pygame.draw.circle(atlas, bg_color, center, 25)
+        pygame.draw.circle(atlas, text_color, center, 25, 2)
+        text = font.render(str(piece), True, text_color)
+        atlas.blit(text, text.get_rect(center=center))
+    return atlas
+
+
+def load_glyphs(path=GLYPH_CACHE):
+    """駒の画像を {(駒種, 色): Surface} で返す（キャッシュがなければ描いて保存する）"""
+    size = (SQUARE_SIZE * len(GLYPH_KEYS), SQUARE_SIZE)
+    atlas = None
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) == size[0] * size[1] * 4:
+            atlas = pygame.image.fromstring(data, size, "RGBA")
+    except OSError:
+        pass
+    if atlas is None:
+        atlas = render_glyphs()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(pygame.image.tostring(atlas, "RGBA"))
+        except OSError:
+            pass  # 書けなくても毎回描けば動く
+    if pygame.display.get_surface():
+        atlas = atlas.convert_alpha()
+    return {key: atlas.subsurface((i * SQUARE_SIZE, 0, SQUARE_SIZE, SQUARE_SIZE))
+            for i, key in enumerate(GLYPH_KEYS)}
 
-        if piece.type == PieceType.PAWN and abs(to_row - from_row) == 2:
-            intermediate_row = (from_row + to_row) // 2
-            self.en_passant_target = (intermediate_row, from_col)
-        else:
-            self.en_passant_target = None
-        
-        # キャスリング時のルーク移動
-        if piece.type == PieceType.KING and abs(to_col - from_col) == 2:
-            row = from_row
-            if to_col == 6:
-                # キングサイド
-                rook = self.get_piece(row, 7)
-                self.set_piece(row, 5, rook)
-                self.set_piece(row, 7, None)
-                rook.move(row, 5)
-            elif to_col == 2:
-                # クイーンサイド
-                rook = self.get_piece(row, 0)
-                self.set_piece(row, 3, rook)
-                self.set_piece(row, 0, None)
-                rook.move(row, 3)
-
-        # 昇格判定 → 昇格待ちにしてターンは切り替えない
-        if piece.type == PieceType.PAWN and ((piece.color == PieceColor.WHITE and to_row == 0) or (piece.color == PieceColor.BLACK and to_row == 7)):
-            self.promotion_pending = True
-            self.promotion_piece = piece
-            # ターン切り替えは昇格完了後に行うため保留
-            return True
-
-        # 通常のターン切り替え
-        self.current_turn = PieceColor.BLACK if self.current_turn == PieceColor.WHITE else PieceColor.WHITE
-        return True
-    
-    def select_piece(self, row, col):
-        """駒を選択"""
-        piece = self.get_piece(row, col)
-        if piece and piece.color == self.current_turn:
-            self.selected_piece = piece
-            self.selected_pos = (row, col)
-            self.possible_moves = piece.get_possible_moves(self)
-            return True
-        return False
-    
-    def deselect_piece(self):
-        """駒の選択を解除"""
-        self.selected_piece = None
-        self.selected_pos = None
-        self.possible_moves = []
 
 class ChessGame:
-    def __init__(self):
+    def __init__(self, ai_color=None, ai_time=1.0, ai_nodes=None, ai_workers=1, ai_book=None,
+                 profile=None, ponder=False):
+        # 使うモジュールだけ初期化する（pygame.init() は音声なども初期化して遅い）
+        pygame.display.init()
+        pygame.font.init()
         self.screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
         pygame.display.set_caption("チェスゲーム")
         self.clock = pygame.time.Clock()
         self.board = ChessBoard()
-        # フォントの設定（日本語対応）
-        try:
-            self.font = pygame.font.Font("msgothic.ttc", 24)  # Windows
-        except:
-            try:
-                self.font = pygame.font.Font("NotoSansCJK-Regular.ttc", 24)  # Linux
-            except:
-                self.font = pygame.font.Font(None, 24)  # フォールバック
-        
-        self.piece_font = pygame.font.Font(None, 60)
-        self.promotion_choices = [
-            PieceType.QUEEN,
-            PieceType.ROOK,
-            PieceType.BISHOP,
-            PieceType.KNIGHT
-        ]
-        
+        # コンピュータ側の設定（ai_color が None なら 2 人対戦）
+        self.ai_color = ai_color
+        self.ai_time = ai_time
+        self.ai_nodes = ai_nodes
+        self.ai_result = None
+        # コンピュータの探索は描画ループの外で行い、毎フレーム結果が届いたかだけを見る。
+        # 1 プロセスなら先読みと同じワーカープロセス、並列探索なら探索をまとめるスレッド
+        # （実際の探索はプールのプロセスで行うので、スレッドは結果を待つだけ）
+        self.searcher = None
+        self.ai_thread = None
+        self.ai_future = None
+        self.ai_searching = None  # 探索中の局面（update_ponder と同じ形）
+        if ai_color and ai_workers > 1:
+            from concurrent.futures import ThreadPoolExecutor
+
+            from parallel_search import ParallelSearcher
+            book = None
+            if ai_book:
+                from book import OpeningBook
+                book = OpeningBook(ai_book)  # 序盤は探索せず定跡から指す
+            self.searcher = ParallelSearcher(ai_workers, book=book)
+            self.ai_thread = ThreadPoolExecutor(max_workers=1)
+        elif ai_color:
+            from ponder import Ponderer
+            self.searcher = Ponderer(book=ai_book)
+        self.promotion_choices = PROMOTION_CHOICES
+
+        # 描画の準備（前回描いた内容を覚えて、変わった所だけ描き直す）
+        self.init_surfaces()
+        self.full_redraw = True
+        self.drawn_states = None
+        self.drawn_info = None
+
+        # 計測（profile に書き出し先を渡すか、F3 でオーバーレイを出すと有効になる）
+        self.profile_path = profile
+        self.profiler = None
+        self.show_overlay = False
+        self.overlay_lines = None
+        self.overlay_updated = 0.0
+        self.overlay_frames = (0, 0.0)
+        if profile:
+            self.enable_profiler()
+
+        # 先読み（ponder か H キーで有効。別プロセスで解析して最善手をヒントに出す）
+        self.ponderer = None
+        self.pondered = None
+        if ponder:
+            self.toggle_ponder()
+
+    def enable_profiler(self):
+        """ホットパスのメソッドを計測つきに差し替える"""
+        if self.profiler is None:
+            from profiler import enable
+            self.profiler = enable(game_class=type(self))
+
+    def toggle_overlay(self):
+        """計測値のオーバーレイの表示を切り替える"""
+        self.enable_profiler()
+        self.show_overlay = not self.show_overlay
+        self.overlay_lines = None
+        self.overlay_updated = 0.0
+
+    def toggle_ponder(self):
+        """先読みのワーカーを起動・終了する"""
+        if self.ponderer is None:
+            from ponder import Ponderer
+            self.ponderer = Ponderer()
+        else:
+            self.ponderer.close()
+            self.ponderer = None
+        self.pondered = None
+
+    def update_ponder(self):
+        """局面が変わっていれば解析し直し、届いたヒントを取り込む（待たない）"""
+        board = self.board
+        if self.is_ai_turn() or board.game_over or board.promotion_pending:
+            wanted = None  # コンピュータの探索と CPU を取り合わないよう止める
+        else:
+            wanted = (id(board), board.zobrist_key, len(board.undo_stack))
+        if wanted != self.pondered:
+            self.pondered = wanted
+            if wanted is None:
+                self.ponderer.stop()
+            else:
+                self.ponderer.analyse(board)
+        self.ponderer.poll()
+
+    @property
+    def hint(self):
+        """今の局面の先読みの結果（SearchResult、まだなければ None）"""
+        return self.ponderer.result if self.ponderer else None
+
+    def update_overlay(self):
+        """オーバーレイの文字列を 0.5 秒ごとに作り直す（前回からの平均フレーム時間）"""
+        now = time.perf_counter()
+        if now - self.overlay_updated < 0.5:
+            return
+        from profiler import MOVE_GENERATION
+        self.overlay_updated = now
+        frame = self.profiler.timers.get("frame")
+        frames = (frame.calls, frame.total) if frame else (0, 0.0)
+        count = frames[0] - self.overlay_frames[0]
+        frame_ms = (frames[1] - self.overlay_frames[1]) / count * 1e3 if count else 0.0
+        self.overlay_frames = frames
+        calls, total = self.profiler.total(MOVE_GENERATION)
+        self.overlay_lines = (f"frame {frame_ms:.2f} ms",
+                              f"FPS {self.clock.get_fps():.1f} / {FPS}",
+                              f"movegen {calls} calls {total * 1e3:.1f} ms")
+
+    # フォントは最初に文字を描くときに開く
+    @functools.cached_property
+    def font(self):
+        return load_font(24)
+
+    @functools.cached_property
+    def piece_font(self):
+        return pygame.font.Font(None, 60)
+
+    @functools.cached_property
+    def small_font(self):
+        return pygame.font.Font(None, 20)
+
     def get_board_pos(self, mouse_pos):
         """マウス位置をボード座標に変換"""
         x, y = mouse_pos
@@ -370,46 +233,48 @@ class ChessGame:
             return row, col
         return None, None
     
-    def draw_board(self):
-        """チェスボードを描画"""
-        for row in range(BOARD_SIZE):
-            for col in range(BOARD_SIZE):
-                color = LIGHT_BROWN if (row + col) % 2 == 0 else DARK_BROWN
-                rect = pygame.Rect(col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
-                pygame.draw.rect(self.screen, color, rect)
-                
-                # 選択中のマスをハイライト
-                if self.board.selected_pos == (row, col):
-                    highlight_surface = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
-                    highlight_surface.fill(SELECTED_COLOR)
-                    self.screen.blit(highlight_surface, (col * SQUARE_SIZE, row * SQUARE_SIZE))
-                
-                # 可能な移動先をハイライト
-                if (row, col) in self.board.possible_moves:
-                    highlight_surface = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
-                    highlight_surface.fill(HIGHLIGHT_COLOR)
-                    self.screen.blit(highlight_surface, (col * SQUARE_SIZE, row * SQUARE_SIZE))
+    def init_surfaces(self):
+        """ハイライトと駒の画像を前もって作っておく（毎フレーム作り直さない）"""
+        self.selected_surface = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
+        self.selected_surface.fill(SELECTED_COLOR)
+        self.highlight_surface = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
+        self.highlight_surface.fill(HIGHLIGHT_COLOR)
+        self.hint_surface = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
+        self.hint_surface.fill(HINT_COLOR)
+
+        self.piece_surfaces = load_glyphs()  # ディスクのキャッシュから読む
+
+    def draw_board(self, squares=None):
+        """チェスボードを描画（squares を指定するとそのマスだけ）"""
+        if squares is None:
+            squares = [(row, col) for row in range(BOARD_SIZE) for col in range(BOARD_SIZE)]
+        hinted = self.hint_squares()
+        for row, col in squares:
+            color = LIGHT_BROWN if (row + col) % 2 == 0 else DARK_BROWN
+            rect = pygame.Rect(col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
+            pygame.draw.rect(self.screen, color, rect)
+            
+            # 選択中のマスをハイライト
+            if self.board.selected_pos == (row, col):
+                self.screen.blit(self.selected_surface, rect)
+            
+            # 可能な移動先をハイライト
+            if (row, col) in self.board.possible_moves:
+                self.screen.blit(self.highlight_surface, rect)
+
+            # 先読みの最善手の移動元と移動先
+            if (row, col) in hinted:
+                self.screen.blit(self.hint_surface, rect)
     
-    def draw_pieces(self):
-        """駒を描画"""
-        for row in range(BOARD_SIZE):
-            for col in range(BOARD_SIZE):
-                piece = self.board.get_piece(row, col)
-                if piece:
-                    # 駒のテキストを描画
-                    text_color = piece.get_display_color()
-                    # 背景色を設定（見やすくするため）
-                    bg_color = WHITE if text_color == BLACK else BLACK
-                    
-                    text = self.piece_font.render(str(piece), True, text_color)
-                    text_rect = text.get_rect(center=(col * SQUARE_SIZE + SQUARE_SIZE // 2,
-                                                    row * SQUARE_SIZE + SQUARE_SIZE // 2))
-                    
-                    # 背景の円を描画
-                    pygame.draw.circle(self.screen, bg_color, text_rect.center, 25)
-                    pygame.draw.circle(self.screen, text_color, text_rect.center, 25, 2)
-                    
-                    self.screen.blit(text, text_rect)
+    def draw_pieces(self, squares=None):
+        """駒を描画（squares を指定するとそのマスだけ）"""
+        if squares is None:
+            squares = [(row, col) for row in range(BOARD_SIZE) for col in range(BOARD_SIZE)]
+        for row, col in squares:
+            piece = self.board.get_piece(row, col)
+            if piece:
+                surface = self.piece_surfaces[(piece.type, piece.color)]
+                self.screen.blit(surface, (col * SQUARE_SIZE, row * SQUARE_SIZE))
     
     def draw_info(self):
         info_y = BOARD_SIZE * SQUARE_SIZE + 10
@@ -420,6 +285,10 @@ class ChessGame:
             text = self.font.render(result_text, True, RED)
             self.screen.blit(text, (10, info_y))
             return  # 勝敗が決まったら他の表示は不要
+        if self.board.draw_reason:
+            text = self.font.render(f"Draw ({self.board.draw_reason})", True, RED)
+            self.screen.blit(text, (10, info_y))
+            return
         if self.board.promotion_pending:
             # 昇格UI描画
             text = self.font.render("Promotion: Select a piece", True, BLACK)
@@ -449,6 +318,8 @@ class ChessGame:
 
         # 通常のターン情報表示は元のコードのまま
         turn_text = f"Current Turn: {'Black' if self.board.current_turn == PieceColor.WHITE else 'White'}"
+        if self.board.is_in_check():
+            turn_text += "  Check!"
         text = self.font.render(turn_text, True, BLACK)
         self.screen.blit(text, (10, info_y))
         
@@ -458,9 +329,159 @@ class ChessGame:
             selected_text = f"Selected: {color_name} {str(piece)} at ({piece.row}, {piece.col})"
             text = self.font.render(selected_text, True, BLACK)
             self.screen.blit(text, (10, info_y + 30))
+
+        # コンピュータの探索状況
+        if self.is_ai_turn():
+            text = self.font.render("AI thinking...", True, BLUE)
+            self.screen.blit(text, (10, info_y + 60))
+        elif self.ai_result and self.ai_result.book:
+            text = self.font.render("AI: book move", True, BLUE)
+            self.screen.blit(text, (10, info_y + 60))
+        elif self.ai_result:
+            result = self.ai_result
+            ai_text = f"AI: depth {result.depth}  {result.nodes} nodes  {result.nps:,.0f} nps"
+            text = self.font.render(ai_text, True, BLUE)
+            self.screen.blit(text, (10, info_y + 60))
+
+    def draw_overlay(self):
+        """計測値を情報欄の右側に描画"""
+        x = WINDOW_WIDTH - 200
+        y = BOARD_SIZE * SQUARE_SIZE + 10
+        for i, line in enumerate(self.overlay_lines):
+            text = self.small_font.render(line, True, BLUE)
+            self.screen.blit(text, (x, y + i * 20))
+
+    def draw_hint(self):
+        """先読みの最善手を情報欄の右下に描画"""
+        hint = self.hint
+        hint_text = f"Hint: {move_name(hint.move)}  depth {hint.depth}  {hint.score:+d}"
+        text = self.small_font.render(hint_text, True, BLUE)
+        self.screen.blit(text, (WINDOW_WIDTH - 200, BOARD_SIZE * SQUARE_SIZE + 70))
+
+    def hint_squares(self):
+        """ヒントの手の移動元と移動先のマス（ヒントがなければ空）"""
+        hint = self.hint
+        if hint is None or hint.move is None:
+            return ()
+        return (hint.move[:2], hint.move[2:4])
+
+    def square_states(self):
+        """マスごとの表示内容（駒・選択・移動先・ヒントのハイライト）のリスト"""
+        board = self.board
+        moves = set(board.possible_moves)
+        selected = board.selected_pos
+        hinted = self.hint_squares()
+        states = []
+        for row in range(BOARD_SIZE):
+            for col in range(BOARD_SIZE):
+                piece = board.board[row][col]
+                states.append(((piece.type, piece.color) if piece else None,
+                               selected == (row, col), (row, col) in moves,
+                               (row, col) in hinted))
+        return states
+
+    def info_state(self):
+        """情報欄の表示内容を決める値の組"""
+        board = self.board
+        return (board.winner, board.draw_reason, board.promotion_pending, board.current_turn,
+                board.is_in_check(), board.selected_pos, self.is_ai_turn(), id(self.ai_result),
+                self.overlay_lines, self.hint_squares(), self.hint and self.hint.depth)
+
+    def render(self):
+        """前回から変わったマスと情報欄だけを描き直し、更新した矩形のリストを返す"""
+        states = self.square_states()
+        if self.full_redraw:
+            self.screen.fill(WHITE)
+            changed = [(row, col) for row in range(BOARD_SIZE) for col in range(BOARD_SIZE)]
+        else:
+            changed = [divmod(i, BOARD_SIZE) for i, state in enumerate(states)
+                       if state != self.drawn_states[i]]
+        rects = [pygame.Rect(col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
+                 for row, col in changed]
+        if changed:
+            self.draw_board(changed)
+            self.draw_pieces(changed)
+
+        info = self.info_state()
+        if self.full_redraw or info != self.drawn_info:
+            info_rect = pygame.Rect(0, BOARD_SIZE * SQUARE_SIZE, WINDOW_WIDTH,
+                                    WINDOW_HEIGHT - BOARD_SIZE * SQUARE_SIZE)
+            self.screen.fill(WHITE, info_rect)
+            self.draw_info()
+            if self.overlay_lines:
+                self.draw_overlay()
+            if self.hint_squares():
+                self.draw_hint()
+            # 勝敗決定後にリスタートの案内表示
+            if self.board.game_over:
+                restart_text = self.font.render("Press R to restart", True, BLUE)
+                self.screen.blit(restart_text, (10, WINDOW_HEIGHT - 40))
+            rects.append(info_rect)
+
+        self.drawn_states = states
+        self.drawn_info = info
+        self.full_redraw = False
+        return rects
+
+    def is_ai_turn(self):
+        """コンピュータが指す番か"""
+        return (self.ai_color is not None and self.board.current_turn == self.ai_color and
+                not self.board.game_over and not self.board.promotion_pending)
+
+    def update_ai(self):
+        """コンピュータの番なら探索を始め、結果が届いていれば指す（待たない）"""
+        board = self.board
+        if not self.is_ai_turn():
+            if self.ai_searching is not None:
+                self.stop_ai_search()  # 一手戻したなど
+            return
+        wanted = (id(board), board.zobrist_key, len(board.undo_stack))
+        if wanted != self.ai_searching:
+            self.ai_searching = wanted
+            self.start_ai_search()
+            return
+        result = self.poll_ai_search()
+        if result is None:
+            return
+        self.ai_searching = None
+        self.ai_result = result
+        move = result.move
+        if move and board.make_move(*move):
+            print(f"AI move: {move_name(move)} ({result})")
+        board.deselect_piece()
+        board.check_game_over()
+
+    def start_ai_search(self):
+        """今の局面でコンピュータの探索を始める"""
+        if self.ai_thread:
+            # 探索中に盤面が変わっても影響しないよう写しを渡す
+            self.ai_future = self.ai_thread.submit(
+                self.searcher.search, self.board.clone(), time_limit=self.ai_time,
+                max_nodes=self.ai_nodes)
+        else:
+            self.searcher.analyse(self.board, self.ai_time, self.ai_nodes)
+
+    def stop_ai_search(self):
+        """探索を打ち切る（並列探索は止められないので、結果を捨てる）"""
+        self.ai_searching = None
+        self.ai_future = None
+        if not self.ai_thread:
+            self.searcher.stop()
+
+    def poll_ai_search(self):
+        """探索が終わっていれば SearchResult を返す（まだなら None）"""
+        if self.ai_thread:
+            if self.ai_future is None or not self.ai_future.done():
+                return None
+            result, self.ai_future = self.ai_future.result(), None
+            return result
+        self.searcher.poll()
+        return self.searcher.result if self.searcher.finished else None
         
     def handle_click(self, mouse_pos):
         """マウスクリックを処理"""
+        if self.is_ai_turn():
+            return  # コンピュータの番はクリックを受け付けない
         if self.board.promotion_pending:
             info_y = BOARD_SIZE * SQUARE_SIZE + 40
             x_start = 10
@@ -468,19 +489,16 @@ class ChessGame:
             for i, p_type in enumerate(self.promotion_choices):
                 rect = pygame.Rect(x_start + i * 60, info_y, box_size, box_size)
                 if rect.collidepoint(mouse_pos):
-                    # ユーザーが選択した駒に昇格
-                    self.board.promotion_piece.type = p_type
-                    self.board.promotion_pending = False
-                    self.board.promotion_piece = None
-                    # 昇格が終わったのでターン切り替え
-                    self.board.current_turn = PieceColor.BLACK if self.board.current_turn == PieceColor.WHITE else PieceColor.WHITE
+                    # ユーザーが選択した駒に昇格（ターン切り替えも行う）
+                    self.board.promote(p_type)
                     self.board.deselect_piece()
+                    self.board.check_game_over()
                     print(f"Promotion selected: {p_type}")
                     return
             return  # 昇格中はそれ以外のクリックは無視
 
         # 以下、既存の選択処理
-        if self.board.winner:
+        if self.board.game_over:
             return # 勝敗が決まったらクリック操作無効
         
         row, col = self.get_board_pos(mouse_pos)
@@ -492,6 +510,7 @@ class ChessGame:
                         print(f"Move made: {from_row},{from_col} -> {row},{col}")
                         print(f"Turn changed to: {self.board.current_turn}")
                         self.board.deselect_piece()
+                        self.board.check_game_over()
                     else:
                         print("Move failed")
                 elif self.board.select_piece(row, col):
@@ -508,40 +527,91 @@ class ChessGame:
     def run(self):
         """メインゲームループ"""
         running = True
+        idle = False
         while running:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
+            events = pygame.event.get()
+            if idle and not events:
+                # 画面が変わらない間は次のイベントまで待つ（再描画しない）
+                events = [pygame.event.wait()]
+            for event in events:
+                if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                    self.full_redraw = True
+                elif event.type == pygame.QUIT:
                     running = False
                 elif event.type == pygame.MOUSEBUTTONDOWN:
                 # 勝敗が決まっていなければクリック処理する
-                    if event.button == 1 and not self.board.winner:
+                    if event.button == 1 and not self.board.game_over:
                         self.handle_click(event.pos)
                 elif event.type == pygame.KEYDOWN:
                     # ゲーム終了時にRキーでリセット
-                    if self.board.winner and event.key == pygame.K_r:
+                    if self.board.game_over and event.key == pygame.K_r:
                         self.board = ChessBoard()  # 新しいボードに入れ替え（リセット）
                         print("Game restarted")
+                    # Hキーで先読み（最善手のヒント）を切り替え
+                    elif event.key == pygame.K_h:
+                        self.toggle_ponder()
+                    # F3キーで計測値のオーバーレイを切り替え
+                    elif event.key == pygame.K_F3:
+                        self.toggle_overlay()
+                    # Uキーで一手戻す
+                    elif event.key == pygame.K_u and self.board.unmake_move():
+                        # コンピュータ対戦ではコンピュータの手と自分の手をまとめて戻す
+                        if self.ai_color and self.board.current_turn == self.ai_color:
+                            self.board.unmake_move()
+                        self.board.deselect_piece()
+                        print("Move undone")
             
-            # 描画
-            self.screen.fill(WHITE)
-            self.draw_board()
-            self.draw_pieces()
-            self.draw_info()
-
-            # 勝敗決定後にリスタートの案内表示
-            if self.board.winner:
-                restart_text = self.font.render("Press R to restart", True, BLUE)
-                self.screen.blit(restart_text, (10, WINDOW_HEIGHT - 40))
-            
-            pygame.display.flip()
+            # 描画（変わった所だけ）
+            if self.show_overlay:
+                self.update_overlay()
+            if self.ai_color:
+                self.update_ai()
+            if self.ponderer:
+                self.update_ponder()
+            frame_start = time.perf_counter()
+            rects = self.render()
+            if rects:
+                pygame.display.update(rects)
+            if self.profiler:
+                self.profiler.add("frame", time.perf_counter() - frame_start)
+            # オーバーレイ表示中は数値を更新し続けるため待たない
+            # 先読み中も結果を受け取るため待たない
+            idle = (not rects and not self.is_ai_turn() and not self.show_overlay and
+                    not (self.ponderer and self.ponderer.running))
             self.clock.tick(FPS)
         
+        if self.ai_thread:
+            self.ai_thread.shutdown(cancel_futures=True)
+        if self.searcher:
+            self.searcher.close()
+        if self.ponderer:
+            self.ponderer.close()
+        if self.profiler and self.profile_path:
+            self.profiler.write(self.profile_path)
+            print(f"Profile written to {self.profile_path}")
         pygame.quit()
         sys.exit()
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="チェスゲーム")
+    parser.add_argument("--ai", choices=["white", "black"], help="コンピュータが持つ色")
+    parser.add_argument("--time", type=float, default=1.0, help="コンピュータの持ち時間（秒）")
+    parser.add_argument("--nodes", type=int, default=None, help="コンピュータの探索ノード数の上限")
+    parser.add_argument("--workers", type=int, default=1, help="コンピュータの探索に使うプロセス数")
+    parser.add_argument("--book", help="コンピュータが序盤に使う定跡ファイル")
+    parser.add_argument("--ponder", action="store_true",
+                        help="人の手番の間に別プロセスで解析し、最善手のヒントを表示する")
+    parser.add_argument("--profile", help="終了時に計測結果を書き出すファイル（.json / .csv）")
+    args = parser.parse_args(argv)
+
+    ai_color = PieceColor[args.ai.upper()] if args.ai else None
+    game = ChessGame(ai_color=ai_color, ai_time=args.time, ai_nodes=args.nodes,
+                     ai_workers=args.workers, ai_book=args.book, profile=args.profile,
+                     ponder=args.ponder)
+    game.run()
+
 # メイン実行
 if __name__ == "__main__":
-    game = ChessGame()
-    game.run()
+    main()
 
 
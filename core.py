@@ -0,0 +1,612 @@
+# チェスのルール（駒・盤面・合法手・FEN・Zobrist キー・千日手）
+#
+# pygame を読み込まないので、CLI ツールや探索のワーカープロセスはこのモジュールだけで
+# 動く。chess.py（ウィンドウ版）はここのクラスをそのまま使い、同じ名前で公開し直す。
+#
+# 局面のスナップショットは SNAPSHOT_SIZE バイトの bytes（変更できない）:
+#   マス 64 個 × 4 ビット（偶数マスが下位。0 = 空、1-6 = 白の駒種、9-14 = 黒の駒種）,
+#   手番とキャスリング権 1 バイト（bit 0 = 黒番、bit 1-4 = KQkq）,
+#   アンパッサンのマス 1 バイト（なければ 255）
+# 手数の欄を除いた FEN と同じ情報を持ち、ChessBoard(snapshot=...) で盤面に戻せる。
+import copy
+from enum import Enum
+
+import bitboard
+import zobrist
+
+# 駒の表示色（UI 用の RGB）
+_DISPLAY_COLORS = {1: (255, 255, 255), 2: (0, 0, 0)}
+
+SNAPSHOT_SIZE = 34
+_FLAGS = 32  # スナップショットの手番とキャスリング権のバイト
+_EN_PASSANT = 33
+_NO_EN_PASSANT = 255
+_BLACK_NIBBLE = 8  # スナップショットのマスの値で黒を表すビット
+REPETITION_LIMIT = 3  # 同じ局面がこの回数現れたら引き分け
+
+class PieceType(Enum):
+    PAWN = 1
+    ROOK = 2
+    KNIGHT = 3
+    BISHOP = 4
+    QUEEN = 5
+    KING = 6
+
+class PieceColor(Enum):
+    WHITE = 1
+    BLACK = 2
+
+# 昇格で選べる駒（UIの並び順）
+PROMOTION_CHOICES = [
+    PieceType.QUEEN,
+    PieceType.ROOK,
+    PieceType.BISHOP,
+    PieceType.KNIGHT
+]
+
+# FEN の駒文字（白は大文字、黒は小文字）
+FEN_PIECES = {
+    "p": PieceType.PAWN,
+    "r": PieceType.ROOK,
+    "n": PieceType.KNIGHT,
+    "b": PieceType.BISHOP,
+    "q": PieceType.QUEEN,
+    "k": PieceType.KING
+}
+
+def move_name(move):
+    """(from_row, from_col, to_row, to_col, 昇格駒) を e2e4 形式の文字列にする"""
+    from_row, from_col, to_row, to_col, promotion = move
+    name = f"{'abcdefgh'[from_col]}{8 - from_row}{'abcdefgh'[to_col]}{8 - to_row}"
+    if promotion:
+        name += next(ch for ch, p_type in FEN_PIECES.items() if p_type == promotion)
+    return name
+
+class Piece:
+    def __init__(self, piece_type, color, row, col):
+        self.type = piece_type
+        self.color = color
+        self.row = row
+        self.col = col
+        self.has_moved = False
+        
+    def get_possible_moves(self, board):
+        """駒の可能な動きを取得（ビットボードから生成）"""
+        ep = board.en_passant_target
+        ep_square = ep[0] * 8 + ep[1] if ep else None
+        targets = board.bitboards.targets(self.row * 8 + self.col, self.color.value,
+                                          self.type.value, ep_square)
+        return bitboard.squares(targets)
+
+    def move(self, new_row, new_col):
+        """駒を移動"""
+        self.row = new_row
+        self.col = new_col
+        self.has_moved = True
+
+    def copy(self):
+        """同じ位置・状態の駒"""
+        piece = Piece(self.type, self.color, self.row, self.col)
+        piece.has_moved = self.has_moved
+        return piece
+    
+    def __str__(self):
+        symbols = {
+            PieceType.PAWN: "P",
+            PieceType.ROOK: "R",
+            PieceType.KNIGHT: "N",
+            PieceType.BISHOP: "B",
+            PieceType.QUEEN: "Q",
+            PieceType.KING: "K"
+        }
+        return symbols[self.type]
+    
+    def get_display_color(self):
+        """駒の表示色を取得"""
+        return _DISPLAY_COLORS[self.color.value]
+
+class ChessBoard:
+    def __init__(self, fen=None, snapshot=None):
+        self.board = [[None for _ in range(8)] for _ in range(8)]
+        self.bitboards = bitboard.Bitboards()  # 移動生成用の占有マスク
+        # スナップショットの中身（set_piece と手番・アンパッサンの変更で差分更新する）
+        self.packed = bytearray(SNAPSHOT_SIZE)
+        self.packed[_EN_PASSANT] = _NO_EN_PASSANT
+        self.zobrist_key = 0  # set_piece と手番・アンパッサンの変更で差分更新する
+        self._current_turn = PieceColor.WHITE
+        self._en_passant_target = None
+        self.selected_piece = None
+        self.selected_pos = None
+        self.winner = None
+        self.draw_reason = None  # 引き分けで終わったときの理由（"stalemate" など）
+        self.possible_moves = []
+        
+        self.promotion_pending = False
+        self.promotion_piece = None
+        # make_move ごとの取り消し情報
+        # (from_row, from_col, to_row, to_col, 移動前の駒種, 移動前の has_moved,
+        #  取った駒, 移動前の en_passant_target, 移動前の手番, 移動前の winner)
+        self.undo_stack = []
+        # 手を指し終えるごとのスナップショット（先頭は開始局面）と、局面キーごとの出現回数
+        self.history = []
+        self.repetitions = {}
+        self.history_base = 0  # undo_stack が空のときの history の長さ - 1
+
+        if snapshot:
+            self.set_snapshot(snapshot)
+        elif fen:
+            self.set_fen(fen)
+        else:
+            self.setup_initial_position()
+            self.reset_history()
+    
+    def setup_initial_position(self):
+        """初期配置を設定"""
+        # 黒の駒
+        piece_order = [PieceType.ROOK, PieceType.KNIGHT, PieceType.BISHOP, PieceType.QUEEN,
+                      PieceType.KING, PieceType.BISHOP, PieceType.KNIGHT, PieceType.ROOK]
+        
+        for col in range(8):
+            # 黒の駒
+            self.set_piece(0, col, Piece(piece_order[col], PieceColor.BLACK, 0, col))
+            self.set_piece(1, col, Piece(PieceType.PAWN, PieceColor.BLACK, 1, col))
+            
+            # 白の駒
+            self.set_piece(7, col, Piece(piece_order[col], PieceColor.WHITE, 7, col))
+            self.set_piece(6, col, Piece(PieceType.PAWN, PieceColor.WHITE, 6, col))
+    
+    @property
+    def current_turn(self):
+        return self._current_turn
+
+    @current_turn.setter
+    def current_turn(self, color):
+        if color != self._current_turn:
+            self.zobrist_key ^= zobrist.SIDE_KEY
+            self.packed[_FLAGS] ^= 1
+        self._current_turn = color
+
+    @property
+    def en_passant_target(self):
+        return self._en_passant_target
+
+    @en_passant_target.setter
+    def en_passant_target(self, target):
+        old = self._en_passant_target
+        if old != target:
+            if old:
+                self.zobrist_key ^= zobrist.EP_KEYS[old[0] * 8 + old[1]]
+            if target:
+                self.zobrist_key ^= zobrist.EP_KEYS[target[0] * 8 + target[1]]
+            self.packed[_EN_PASSANT] = target[0] * 8 + target[1] if target else _NO_EN_PASSANT
+        self._en_passant_target = target
+
+    def compute_zobrist_key(self):
+        """Zobrist キーを一から計算（差分更新の検証用）"""
+        key = 0
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece:
+                    key ^= zobrist.PIECE_KEYS[piece.color.value][piece.type.value][row * 8 + col]
+        if self.current_turn == PieceColor.BLACK:
+            key ^= zobrist.SIDE_KEY
+        if self.en_passant_target:
+            key ^= zobrist.EP_KEYS[self.en_passant_target[0] * 8 + self.en_passant_target[1]]
+        return key ^ zobrist.CASTLING_KEYS[self.bitboards.castling_rights()]
+
+    def set_fen(self, fen):
+        """FEN 文字列から局面を設定（手数の欄は無視する）"""
+        fields = fen.split()
+        rows = fields[0].split("/")
+        if len(rows) != 8:
+            raise ValueError(f"Invalid FEN: {fen}")
+        castling = fields[2] if len(fields) > 2 else "-"
+        rights = sum(flag for flag, ch in zip((1, 2, 4, 8), "KQkq") if ch in castling)
+
+        self.clear()
+
+        for row, rank in enumerate(rows):
+            col = 0
+            for ch in rank:
+                if ch.isdigit():
+                    col += int(ch)
+                    continue
+                color = PieceColor.WHITE if ch.isupper() else PieceColor.BLACK
+                self._place(row, col, FEN_PIECES[ch.lower()], color, rights)
+                col += 1
+
+        self.current_turn = PieceColor.BLACK if len(fields) > 1 and fields[1] == "b" else PieceColor.WHITE
+        ep = fields[3] if len(fields) > 3 else "-"
+        self.en_passant_target = None if ep == "-" else (8 - int(ep[1]), ord(ep[0]) - ord("a"))
+        self._reset_state()
+
+    def clear(self):
+        """盤上の駒を全て取り除く"""
+        for row in range(8):
+            for col in range(8):
+                if self.board[row][col]:
+                    self.set_piece(row, col, None)
+
+    def _place(self, row, col, p_type, color, rights):
+        """駒を置く。キャスリング権（KQkq の 4 ビット）はキングとルークの has_moved で表す"""
+        piece = Piece(p_type, color, row, col)
+        white = color == PieceColor.WHITE
+        home_row = 7 if white else 0
+        own = rights if white else rights >> 2  # bit 0 = キング側、bit 1 = クイーン側
+        if p_type == PieceType.PAWN:
+            piece.has_moved = row != (6 if white else 1)
+        elif p_type == PieceType.KING:
+            piece.has_moved = not (row == home_row and col == 4 and own & 3)
+        elif p_type == PieceType.ROOK:
+            piece.has_moved = not (row == home_row and
+                                   ((col == 7 and own & 1) or (col == 0 and own & 2)))
+        else:
+            piece.has_moved = True
+        self.set_piece(row, col, piece)
+
+    def _reset_state(self):
+        """局面を置き直した後の状態（勝敗・昇格待ち・取り消し・履歴）を初期化"""
+        self.winner = None
+        self.draw_reason = None
+        self.promotion_pending = False
+        self.promotion_piece = None
+        self.undo_stack = []
+        self.reset_history()
+        self.deselect_piece()
+
+    def snapshot(self):
+        """今の局面のスナップショット（SNAPSHOT_SIZE バイトの bytes）"""
+        return bytes(self.packed)
+
+    def set_snapshot(self, snapshot):
+        """スナップショットから局面を設定（駒の has_moved は set_fen と同じ決め方）"""
+        if len(snapshot) != SNAPSHOT_SIZE:
+            raise ValueError(f"Invalid snapshot size: {len(snapshot)}")
+        self.clear()
+        flags = snapshot[_FLAGS]
+        rights = flags >> 1
+        for index in range(_FLAGS):
+            pair = snapshot[index]
+            if not pair:
+                continue
+            for sq, value in ((index * 2, pair & 15), (index * 2 + 1, pair >> 4)):
+                if value:
+                    color = PieceColor.BLACK if value & _BLACK_NIBBLE else PieceColor.WHITE
+                    self._place(sq >> 3, sq & 7, PieceType(value & 7), color, rights)
+        self.current_turn = PieceColor.BLACK if flags & 1 else PieceColor.WHITE
+        ep = snapshot[_EN_PASSANT]
+        self.en_passant_target = None if ep == _NO_EN_PASSANT else (ep >> 3, ep & 7)
+        self._reset_state()
+
+    def clone(self):
+        """局面と履歴（千日手の判定用）を写した ChessBoard（取り消しの情報と選択は写さない）
+
+        駒を置き直さずに、駒・ビットボード・Zobrist キーをそのまま写す。
+        """
+        board = copy.copy(self)
+        board.board = [[piece.copy() if piece else None for piece in row] for row in self.board]
+        board.bitboards = self.bitboards.copy()
+        board.packed = self.packed[:]
+        board.undo_stack = []
+        board.history = self.history[:]
+        board.repetitions = dict(self.repetitions)
+        board.history_base = len(board.history) - 1
+        if self.promotion_piece:
+            board.promotion_piece = board.board[self.promotion_piece.row][self.promotion_piece.col]
+        board.deselect_piece()
+        return board
+
+    def reset_history(self):
+        """今の局面だけを履歴にする"""
+        self.history = [self.snapshot()]
+        self.repetitions = {self.zobrist_key: 1}
+        self.history_base = 0
+
+    def _record(self):
+        """手を指し終えた局面を履歴に足す"""
+        self.history.append(self.snapshot())
+        key = self.zobrist_key
+        self.repetitions[key] = self.repetitions.get(key, 0) + 1
+
+    def repetition_count(self):
+        """今の局面がこれまでに現れた回数（今を含む）"""
+        return self.repetitions.get(self.zobrist_key, 0)
+
+    def to_fen(self):
+        """局面を FEN 文字列にする（手数の欄は 0 1 とする）"""
+        symbols = {p_type: ch for ch, p_type in FEN_PIECES.items()}
+        rows = []
+        for row in range(8):
+            rank = ""
+            empty = 0
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece is None:
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                ch = symbols[piece.type]
+                rank += ch.upper() if piece.color == PieceColor.WHITE else ch
+            if empty:
+                rank += str(empty)
+            rows.append(rank)
+
+        rights = self.bitboards.castling_rights()
+        castling = "".join(ch for flag, ch in zip((1, 2, 4, 8), "KQkq") if rights & flag) or "-"
+        if self.en_passant_target:
+            row, col = self.en_passant_target
+            ep = f"{'abcdefgh'[col]}{8 - row}"
+        else:
+            ep = "-"
+        side = "w" if self.current_turn == PieceColor.WHITE else "b"
+        return f"{'/'.join(rows)} {side} {castling} {ep} 0 1"
+
+    def get_piece(self, row, col):
+        """指定位置の駒を取得"""
+        if 0 <= row < 8 and 0 <= col < 8:
+            return self.board[row][col]
+        return None
+    
+    def set_piece(self, row, col, piece):
+        """指定位置に駒を配置（ビットボードも更新）"""
+        if 0 <= row < 8 and 0 <= col < 8:
+            sq = row * 8 + col
+            bbs = self.bitboards
+            # キャスリングに関わるマスならキャスリング権の分も入れ替える
+            castling_square = bitboard.CASTLING_SQUARES >> sq & 1
+            if castling_square:
+                self.zobrist_key ^= zobrist.CASTLING_KEYS[bbs.castling_rights()]
+            old = self.board[row][col]
+            if old:
+                bbs.remove(sq, old.color.value, old.type.value)
+                self.zobrist_key ^= zobrist.PIECE_KEYS[old.color.value][old.type.value][sq]
+            # スナップショットのマス（4 ビット）も書き換える
+            shift = (sq & 1) << 2
+            value = 0
+            if piece:
+                bbs.put(sq, piece.color.value, piece.type.value, piece.has_moved)
+                self.zobrist_key ^= zobrist.PIECE_KEYS[piece.color.value][piece.type.value][sq]
+                value = piece.type.value | (_BLACK_NIBBLE if piece.color == PieceColor.BLACK else 0)
+            packed = self.packed
+            packed[sq >> 1] = packed[sq >> 1] & (0xF0 >> shift) | value << shift
+            if castling_square:
+                rights = bbs.castling_rights()
+                self.zobrist_key ^= zobrist.CASTLING_KEYS[rights]
+                packed[_FLAGS] = packed[_FLAGS] & 1 | rights << 1
+            self.board[row][col] = piece
+    
+    def is_valid_move(self, from_row, from_col, to_row, to_col):
+        """移動が有効かチェック（基本的な範囲チェック）"""
+        if not (0 <= to_row < 8 and 0 <= to_col < 8):
+            return False
+        
+        piece = self.get_piece(from_row, from_col)
+        if not piece:
+            return False
+        
+        target_piece = self.get_piece(to_row, to_col)
+        if target_piece and target_piece.color == piece.color:
+            return False
+        
+        return True
+    
+    def make_move(self, from_row, from_col, to_row, to_col, promotion=None):
+        """駒を移動（promotion を指定すると昇格もその場で完了させる）"""
+        piece = self.get_piece(from_row, from_col)
+        if not piece or piece.color != self.current_turn:
+            return False
+
+        is_en_passant = False
+        if piece.type == PieceType.PAWN and self.en_passant_target == (to_row, to_col):
+            is_en_passant = True
+
+        if not self.is_valid_move(from_row, from_col, to_row, to_col):
+            return False
+
+        #target_pieceを定義
+        target_piece = self.get_piece(to_row, to_col)
+
+        captured = self.get_piece(from_row, to_col) if is_en_passant else target_piece
+        self.undo_stack.append((from_row, from_col, to_row, to_col, piece.type, piece.has_moved,
+                                captured, self.en_passant_target, self.current_turn, self.winner))
+        
+        # キングが取られたら勝敗を設定
+        if target_piece and target_piece.type == PieceType.KING:
+            piece.move(to_row, to_col)
+            self.set_piece(to_row, to_col, piece)
+            self.set_piece(from_row, from_col, None)
+            self.winner = piece.color  # 勝った側の色
+            self._record()
+            return True
+        
+
+        if is_en_passant:
+            self.set_piece(from_row, to_col, None)
+
+        piece.move(to_row, to_col)
+        self.set_piece(to_row, to_col, piece)
+        self.set_piece(from_row, from_col, None)
+
+        if piece.type == PieceType.PAWN and abs(to_row - from_row) == 2:
+            intermediate_row = (from_row + to_row) // 2
+            self.en_passant_target = (intermediate_row, from_col)
+        else:
+            self.en_passant_target = None
+        
+        # キャスリング時のルーク移動
+        if piece.type == PieceType.KING and abs(to_col - from_col) == 2:
+            row = from_row
+            if to_col == 6:
+                # キングサイド
+                rook = self.get_piece(row, 7)
+                rook.move(row, 5)
+                self.set_piece(row, 5, rook)
+                self.set_piece(row, 7, None)
+            elif to_col == 2:
+                # クイーンサイド
+                rook = self.get_piece(row, 0)
+                rook.move(row, 3)
+                self.set_piece(row, 3, rook)
+                self.set_piece(row, 0, None)
+
+        # 昇格判定 → 昇格待ちにしてターンは切り替えない
+        if piece.type == PieceType.PAWN and ((piece.color == PieceColor.WHITE and to_row == 0) or (piece.color == PieceColor.BLACK and to_row == 7)):
+            self.promotion_pending = True
+            self.promotion_piece = piece
+            if promotion:
+                self.promote(promotion)
+            # ターン切り替え（と履歴への記録）は昇格完了後に行うため保留
+            return True
+
+        # 通常のターン切り替え
+        self.current_turn = PieceColor.BLACK if self.current_turn == PieceColor.WHITE else PieceColor.WHITE
+        self._record()
+        return True
+    
+    def promote(self, piece_type):
+        """昇格待ちのポーンを指定の駒に昇格させ、ターンを切り替える"""
+        piece = self.promotion_piece
+        self.set_piece(piece.row, piece.col, None)
+        piece.type = piece_type
+        self.set_piece(piece.row, piece.col, piece)
+        self.promotion_pending = False
+        self.promotion_piece = None
+        self.current_turn = PieceColor.BLACK if self.current_turn == PieceColor.WHITE else PieceColor.WHITE
+        self._record()
+
+    def unmake_move(self):
+        """直前の make_move を取り消す（昇格・キャスリング・アンパッサンも元に戻す）"""
+        if not self.undo_stack:
+            return False
+        (from_row, from_col, to_row, to_col, piece_type, had_moved,
+         captured, en_passant_target, turn, winner) = self.undo_stack.pop()
+
+        # 指し終えていた手なら（昇格待ちでなければ）履歴からも除く
+        if len(self.history) - 1 - self.history_base > len(self.undo_stack):
+            self.history.pop()
+            key = self.zobrist_key
+            count = self.repetitions[key] - 1
+            if count:
+                self.repetitions[key] = count
+            else:
+                del self.repetitions[key]
+
+        piece = self.board[to_row][to_col]
+        self.set_piece(to_row, to_col, None)
+        piece.type = piece_type  # 昇格していればポーンに戻す
+        piece.row, piece.col = from_row, from_col
+        piece.has_moved = had_moved
+        self.set_piece(from_row, from_col, piece)
+
+        # キャスリングしていればルークを戻す
+        if piece_type == PieceType.KING and abs(to_col - from_col) == 2:
+            rook_from, rook_to = (7, 5) if to_col == 6 else (0, 3)
+            rook = self.board[from_row][rook_to]
+            self.set_piece(from_row, rook_to, None)
+            rook.col = rook_from
+            rook.has_moved = False
+            self.set_piece(from_row, rook_from, rook)
+
+        # 取った駒は取られた位置（row, col）を覚えている
+        if captured:
+            self.set_piece(captured.row, captured.col, captured)
+
+        self.en_passant_target = en_passant_target
+        self.current_turn = turn
+        self.winner = winner
+        self.draw_reason = None
+        self.promotion_pending = False
+        self.promotion_piece = None
+        return True
+
+    def get_all_moves(self):
+        """手番側の全ての可能な動き（自分のキングへの王手を無視）を
+        (from_row, from_col, to_row, to_col, 昇格駒) で取得"""
+        if self.winner or self.promotion_pending:
+            return []
+        bbs = self.bitboards
+        color = self.current_turn.value
+        ep = self.en_passant_target
+        ep_square = ep[0] * 8 + ep[1] if ep else None
+        # 駒種ごとのマスクから直接生成する（Piece オブジェクトを経由しない）
+        generated = []
+        for p_type in PieceType:
+            pieces = bbs.pieces[color][p_type.value]
+            while pieces:
+                low = pieces & -pieces
+                pieces ^= low
+                sq = low.bit_length() - 1
+                generated.append((sq, p_type.value, bbs.targets(sq, color, p_type.value, ep_square)))
+        return self._expand_moves(generated)
+
+    def get_legal_moves(self):
+        """手番側の合法手（王手放置・ピンされた駒の移動・王手を通るキャスリングを除く）"""
+        if self.winner or self.promotion_pending or self.draw_reason:
+            return []
+        ep = self.en_passant_target
+        ep_square = ep[0] * 8 + ep[1] if ep else None
+        return self._expand_moves(self.bitboards.legal_targets(self.current_turn.value, ep_square))
+
+    def _expand_moves(self, generated):
+        """(マス, 駒種, 移動先ビットボード) の列を手のリストにする（昇格は駒ごとに展開）"""
+        moves = []
+        coords = bitboard.COORDS
+        last_row = 0 if self.current_turn == PieceColor.WHITE else 7
+        for sq, p_type, targets in generated:
+            row, col = coords[sq]
+            while targets:
+                low = targets & -targets
+                targets ^= low
+                to_row, to_col = coords[low.bit_length() - 1]
+                if p_type == bitboard.PAWN and to_row == last_row:
+                    for promotion in PROMOTION_CHOICES:
+                        moves.append((row, col, to_row, to_col, promotion))
+                else:
+                    moves.append((row, col, to_row, to_col, None))
+        return moves
+
+    @property
+    def game_over(self):
+        """勝敗または引き分けが決まったか"""
+        return self.winner is not None or self.draw_reason is not None
+
+    def is_in_check(self, color=None):
+        """color（省略時は手番側）のキングが王手されているか"""
+        color = color or self.current_turn
+        return self.bitboards.in_check(color.value)
+
+    def check_game_over(self):
+        """手番側に合法手がなければ、チェックメイト（winner を設定）かステイルメイトにする"""
+        if self.winner or self.draw_reason or self.promotion_pending:
+            return self.winner is not None or self.draw_reason is not None
+        if self.repetition_count() >= REPETITION_LIMIT:
+            self.draw_reason = "threefold repetition"
+            return True
+        if self.get_legal_moves():
+            return False
+        if self.is_in_check():
+            self.winner = PieceColor.BLACK if self.current_turn == PieceColor.WHITE else PieceColor.WHITE
+        else:
+            self.draw_reason = "stalemate"
+        return True
+
+    def select_piece(self, row, col):
+        """駒を選択"""
+        piece = self.get_piece(row, col)
+        if piece and piece.color == self.current_turn:
+            self.selected_piece = piece
+            self.selected_pos = (row, col)
+            # 合法手だけを移動先にする（昇格の重複は除く）
+            self.possible_moves = list(dict.fromkeys(
+                (move[2], move[3]) for move in self.get_legal_moves() if move[:2] == (row, col)))
+            return True
+        return False
+    
+    def deselect_piece(self):
+        """駒の選択を解除"""
+        self.selected_piece = None
+        self.selected_pos = None
+        self.possible_moves = []
@@ -0,0 +1,97 @@
+# 局面評価（駒の価値 + 駒ごとの位置評価表）
+# 位置評価表は白から見た並びで、row 0 が 8 段目（黒の初期配置側）。黒は上下を反転して引く
+import bitboard
+
+# 駒の価値（キングは取られた時点で終局なので探索側で扱う）
+MATERIAL = [0, 100, 500, 320, 330, 900, 0]  # [駒種]（PAWN, ROOK, KNIGHT, BISHOP, QUEEN, KING）
+
+_PAWN_TABLE = [
+    0, 0, 0, 0, 0, 0, 0, 0,
+    50, 50, 50, 50, 50, 50, 50, 50,
+    10, 10, 20, 30, 30, 20, 10, 10,
+    5, 5, 10, 25, 25, 10, 5, 5,
+    0, 0, 0, 20, 20, 0, 0, 0,
+    5, -5, -10, 0, 0, -10, -5, 5,
+    5, 10, 10, -20, -20, 10, 10, 5,
+    0, 0, 0, 0, 0, 0, 0, 0,
+]
+_KNIGHT_TABLE = [
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20, 0, 0, 0, 0, -20, -40,
+    -30, 0, 10, 15, 15, 10, 0, -30,
+    -30, 5, 15, 20, 20, 15, 5, -30,
+    -30, 0, 15, 20, 20, 15, 0, -30,
+    -30, 5, 10, 15, 15, 10, 5, -30,
+    -40, -20, 0, 5, 5, 0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50,
+]
+_BISHOP_TABLE = [
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 10, 10, 5, 0, -10,
+    -10, 5, 5, 10, 10, 5, 5, -10,
+    -10, 0, 10, 10, 10, 10, 0, -10,
+    -10, 10, 10, 10, 10, 10, 10, -10,
+    -10, 5, 0, 0, 0, 0, 5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20,
+]
+_ROOK_TABLE = [
+    0, 0, 0, 0, 0, 0, 0, 0,
+    5, 10, 10, 10, 10, 10, 10, 5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    0, 0, 0, 5, 5, 0, 0, 0,
+]
+_QUEEN_TABLE = [
+    -20, -10, -10, -5, -5, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 5, 5, 5, 0, -10,
+    -5, 0, 5, 5, 5, 5, 0, -5,
+    0, 0, 5, 5, 5, 5, 0, -5,
+    -10, 5, 5, 5, 5, 5, 0, -10,
+    -10, 0, 5, 0, 0, 0, 0, -10,
+    -20, -10, -10, -5, -5, -10, -10, -20,
+]
+_KING_TABLE = [
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+    20, 20, 0, 0, 0, 0, 20, 20,
+    20, 30, 10, 0, 0, 10, 30, 20,
+]
+
+# PIECE_SQUARE[色][駒種][マス] : 駒の価値 + 位置評価（その色から見た値）
+PIECE_SQUARE = [[[0] * 64 for _ in range(7)] for _ in range(3)]
+for _ptype, _table in ((bitboard.PAWN, _PAWN_TABLE), (bitboard.ROOK, _ROOK_TABLE),
+                       (bitboard.KNIGHT, _KNIGHT_TABLE), (bitboard.BISHOP, _BISHOP_TABLE),
+                       (bitboard.QUEEN, _QUEEN_TABLE), (bitboard.KING, _KING_TABLE)):
+    for _sq in range(64):
+        PIECE_SQUARE[bitboard.WHITE][_ptype][_sq] = MATERIAL[_ptype] + _table[_sq]
+        PIECE_SQUARE[bitboard.BLACK][_ptype][_sq] = MATERIAL[_ptype] + _table[_sq ^ 56]
+
+
+def evaluate_bitboards(bbs):
+    """白から見た評価値（センチポーン）"""
+    score = 0
+    for color, sign in ((bitboard.WHITE, 1), (bitboard.BLACK, -1)):
+        tables = PIECE_SQUARE[color]
+        for ptype in range(bitboard.PAWN, bitboard.KING + 1):
+            table = tables[ptype]
+            mask = bbs.pieces[color][ptype]
+            while mask:
+                low = mask & -mask
+                score += sign * table[low.bit_length() - 1]
+                mask ^= low
+    return score
+
+
+def evaluate(board):
+    """手番側から見た ChessBoard の評価値"""
+    score = evaluate_bitboards(board.bitboards)
+    return score if board.current_turn.value == bitboard.WHITE else -score
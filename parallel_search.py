@@ -0,0 +1,170 @@
+# 複数プロセスでの並列探索（ルート分割）
+#
+# ルートの手をプロセスプールのワーカーに分けて読ませる。局面は FEN 文字列で渡し、
+# それまでに見つかった最善の評価値を共有メモリ（multiprocessing.Value）に置いて、
+# 各ワーカーはそれをαとして使う。ワーカーごとの置換表は深さを進めても使い回す。
+import argparse
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from core import ChessBoard, move_name
+from search import INF, MATE, MAX_PLY, Searcher, SearchResult, book_result
+
+# ワーカープロセス側の状態（_init_worker で設定）
+_searcher = None
+_shared_alpha = None
+
+
+def _init_worker(shared_alpha):
+    global _searcher, _shared_alpha
+    _searcher = Searcher()
+    _shared_alpha = shared_alpha
+
+
+def _warm_up(_):
+    """プールのプロセスを起動しておくための空タスク"""
+    time.sleep(0.05)
+
+
+def _search_root_move(fen, move, depth, deadline):
+    """ワーカー: ルートの 1 手を読み、(move, 評価値, 正確な値か, ノード数, 打ち切られたか) を返す
+
+    読み始めたときのαを超えなかった評価値は上界でしかない（αと同じ値になる）ので、
+    正確な値かどうかも返す。
+    """
+    board = ChessBoard(fen)
+    alpha = _shared_alpha.value
+    score = _searcher.score_move(board, move, depth, alpha, INF, deadline)
+    exact = score > alpha
+    if not _searcher.stopped and exact:
+        with _shared_alpha.get_lock():
+            if score > _shared_alpha.value:
+                _shared_alpha.value = score
+    return move, score, exact, _searcher.nodes, _searcher.stopped
+
+
+class ParallelSearcher:
+    """Searcher と同じ search() を持つ、ルート分割の並列探索"""
+
+    def __init__(self, workers=None, book=None):
+        self.workers = workers or multiprocessing.cpu_count()
+        self.book = book  # 定跡はルートでだけ引く（ワーカーには渡さない）
+        self.shared_alpha = multiprocessing.Value("q", -INF)
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                        initargs=(self.shared_alpha,))
+        list(self.pool.map(_warm_up, range(self.workers)))
+
+    def close(self):
+        """ワーカープロセスを終了"""
+        self.pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def search(self, board, time_limit=1.0, max_nodes=None, max_depth=MAX_PLY, callback=None):
+        """board の手番側の最善手を探す（Searcher.search と同じ引数・戻り値）
+
+        max_nodes は深さの区切りでだけ確認する。
+        """
+        start = time.perf_counter()
+        result = book_result(self.book, board, start)
+        if result:
+            return result
+        deadline = start + time_limit if time_limit else None
+        fen = board.to_fen()
+
+        result = SearchResult()
+        root_moves = board.get_legal_moves()
+        if not root_moves:
+            return result
+        result.move = root_moves[0]
+        nodes = 0
+
+        for depth in range(1, max_depth + 1):
+            self.shared_alpha.value = -INF
+            futures = [self.pool.submit(_search_root_move, fen, move, depth, deadline)
+                       for move in root_moves]
+            scores = {}
+            stopped = False
+            for future in futures:
+                move, score, exact, move_nodes, move_stopped = future.result()
+                nodes += move_nodes
+                stopped = stopped or move_stopped
+                scores[move] = (score, exact)
+            if stopped:
+                break  # 途中で打ち切った深さの結果は使わない
+
+            # 最善手は正確な値の手から選ぶ（上界の手はαと同点になるだけで、それより良いとは限らない）。
+            # 最初に読み終えた手はα = -INF から読むので、正確な値の手は必ずある。
+            # 次の深さは評価値の高い手から読ませる（αが早く上がる。同点なら正確な値の手を先に）
+            root_moves.sort(key=lambda move: scores[move], reverse=True)
+            result.move = next(move for move in root_moves if scores[move][1])
+            result.score = scores[result.move][0]
+            result.depth = depth
+            result.nodes = nodes
+            result.elapsed = time.perf_counter() - start
+            result.pv = [result.move]
+            if callback:
+                callback(result)
+            if abs(result.score) >= MATE - MAX_PLY:
+                break
+            if max_nodes and nodes >= max_nodes:
+                break
+            if deadline and time.perf_counter() + result.elapsed * 2 > deadline:
+                break
+
+        result.nodes = nodes
+        result.elapsed = time.perf_counter() - start
+        return result
+
+
+def benchmark(fen, depth, worker_counts):
+    """固定深さで 1 プロセス探索と並列探索の時間を比べて表示し、結果が同じかを確かめる
+
+    並列探索の評価値と、選んだ手を 1 プロセスで読み直した評価値がどちらも 1 プロセス探索の
+    評価値と同じなら一致とする（同点の手はどちらを選んでもよい）。一致しなければ False を返す。
+    """
+    board = ChessBoard(fen)
+    start = time.perf_counter()
+    base = Searcher().search(board, time_limit=None, max_depth=depth)
+    base_time = time.perf_counter() - start
+    print(f"single   : {base_time:7.2f}s  {base.nodes:>9} nodes  {base.nps:>10,.0f} nps  "
+          f"best {move_name(base.move)} score {base.score}")
+
+    matches = True
+    for workers in worker_counts:
+        with ParallelSearcher(workers) as searcher:
+            board = ChessBoard(fen)
+            start = time.perf_counter()
+            result = searcher.search(board, time_limit=None, max_depth=depth)
+            elapsed = time.perf_counter() - start
+        board = ChessBoard(fen)
+        rescored = Searcher().score_move(board, result.move, depth)
+        same = result.score == base.score == rescored
+        matches = matches and same
+        print(f"{workers} workers: {elapsed:7.2f}s  {result.nodes:>9} nodes  {result.nps:>10,.0f} nps  "
+              f"best {move_name(result.move)} score {result.score}  speedup {base_time / elapsed:.2f}x"
+              f"{'' if same else f'  MISMATCH (move scores {rescored})'}")
+    return matches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="並列探索の速度向上を固定深さで測る")
+    parser.add_argument("--fen", default=None, help="探索する局面（省略時は初期配置）")
+    parser.add_argument("--depth", type=int, default=4, help="探索する深さ")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8],
+                        help="試すワーカー数")
+    args = parser.parse_args(argv)
+
+    print(f"cpu count: {multiprocessing.cpu_count()}")
+    matches = benchmark(args.fen or ChessBoard().to_fen(), args.depth, args.workers)
+    return 0 if matches else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
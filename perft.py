@@ -0,0 +1,126 @@
+# perft: 指定した深さまでの末端局面数を数え、移動生成の速度と正しさを確認する
+#
+# 既定では get_all_moves（王手を無視し、キングが取られた時点で終局する疑似合法手）で数える。
+# その参照値は一般的な perft の値ではなく、ビットボード化する前のマス単位の
+# 移動生成で数えた値を使っている。--legal では get_legal_moves で数え、
+# 一般的な perft の値と比べる。昇格は昇格先ごとに 1 手と数える。
+import argparse
+import sys
+import time
+
+from core import ChessBoard, move_name
+from zobrist import TranspositionTable
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# (名前, FEN, 疑似合法手での末端局面数 [深さ1, 深さ2, ...], 合法手での末端局面数)
+REFERENCE_POSITIONS = [
+    ("initial", START_FEN,
+     [20, 400, 8902, 197742], [20, 400, 8902, 197281]),
+    # キャスリング・アンパッサン・ピンの多い局面
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     [48, 2049, 98903], [48, 2039, 97862]),
+    # アンパッサンと横方向のピンが絡む終盤
+    ("en-passant", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     [16, 278, 4840, 88813], [14, 191, 2812, 43238]),
+    # 両側の昇格と黒のキャスリング（白は王手されている）
+    ("promotion", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     [38, 1845, 71811], [6, 264, 9467]),
+    # 取りながらの昇格
+    ("promotion-capture", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     [44, 1552, 71104], [44, 1486, 62379]),
+    # アンパッサン直後の局面
+    ("en-passant-target", "rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3",
+     [31, 747, 23125], [31, 707, 21637]),
+]
+
+
+def perft(board, depth, table=None, legal=False):
+    """depth 手先の末端局面数を数える（table があれば合流した局面の結果を使い回す）"""
+    if table is not None and depth > 1:
+        entry = table.probe(board.zobrist_key)
+        if entry is not None and entry[1] == depth:
+            return entry[2]
+    moves = board.get_legal_moves() if legal else board.get_all_moves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        board.make_move(*move)
+        nodes += perft(board, depth - 1, table, legal)
+        board.unmake_move()
+    if table is not None:
+        table.store(board.zobrist_key, depth, nodes)
+    return nodes
+
+
+def divide(board, depth, table=None, legal=False):
+    """最初の手ごとの末端局面数を返す（生成器の差分調査用）"""
+    result = {}
+    for move in (board.get_legal_moves() if legal else board.get_all_moves()):
+        board.make_move(*move)
+        result[move] = perft(board, depth - 1, table, legal) if depth > 1 else 1
+        board.unmake_move()
+    return result
+
+
+def run(fen, depth, expected=None, show_divide=False, hash_size=0, legal=False):
+    """1 局面を深さ 1..depth で数えて表示。参照値と食い違えば False"""
+    ok = True
+    for d in range(1, depth + 1):
+        board = ChessBoard(fen)
+        table = TranspositionTable(hash_size) if hash_size else None
+        start = time.perf_counter()
+        if show_divide and d == depth:
+            counts = divide(board, d, table, legal)
+            for move, count in sorted(counts.items(), key=lambda item: move_name(item[0])):
+                print(f"  {move_name(move)}: {count}")
+            nodes = sum(counts.values())
+        else:
+            nodes = perft(board, d, table, legal)
+        elapsed = time.perf_counter() - start
+        nps = nodes / elapsed if elapsed > 0 else 0.0
+        line = f"  depth {d}: {nodes:>10} nodes  {elapsed:8.3f}s  {nps:12,.0f} nps"
+        if expected and d <= len(expected):
+            if nodes == expected[d - 1]:
+                line += "  ok"
+            else:
+                line += f"  MISMATCH (expected {expected[d - 1]})"
+                ok = False
+        print(line)
+        if table is not None:
+            stats = table.stats()
+            print(f"    hash: {stats['hits']} hits / {stats['misses']} misses "
+                  f"({stats['hit_rate']:.1%}), {stats['used']}/{stats['size']} slots used")
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="perft による移動生成のベンチマークと検証")
+    parser.add_argument("depth", type=int, nargs="?", default=None,
+                        help="数える深さ（省略時は参照値のある深さまで）")
+    parser.add_argument("--fen", help="数える局面（省略時は参照局面の一式）")
+    parser.add_argument("--expect", type=int, nargs="*", help="--fen の局面の深さ 1.. の参照値")
+    parser.add_argument("--divide", action="store_true", help="最後の深さで最初の手ごとの内訳を表示")
+    parser.add_argument("--hash", type=int, default=0, metavar="ENTRIES",
+                        help="置換表のエントリ数（0 なら使わない）")
+    parser.add_argument("--legal", action="store_true", help="合法手（王手・ピンを考慮）で数える")
+    args = parser.parse_args(argv)
+
+    if args.fen:
+        depth = args.depth or (len(args.expect) if args.expect else 3)
+        print(args.fen)
+        ok = run(args.fen, depth, args.expect, args.divide, args.hash, args.legal)
+    else:
+        ok = True
+        for name, fen, pseudo_counts, legal_counts in REFERENCE_POSITIONS:
+            expected = legal_counts if args.legal else pseudo_counts
+            depth = min(args.depth, len(expected)) if args.depth else len(expected)
+            print(f"{name}: {fen}")
+            ok = run(fen, depth, expected, args.divide, args.hash, args.legal) and ok
+    print("all counts match" if ok else "perft MISMATCH")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,433 @@
+# PGN / FEN の読み書きと一括検証
+#
+# ファイル全体を読み込まず、1 局（FEN は 1 行）ずつジェネレータで流す。各局は
+# ChessBoard.make_move で指し直して合法性を確かめ、FEN や整形した PGN として書き出せる。
+# 大きなファイルはバイト範囲に分けてワーカープロセスで並列に検証する。
+import argparse
+import os
+import re
+import sys
+import time
+
+from core import FEN_PIECES, ChessBoard, PieceColor, PieceType
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+
+# 指し手部分の字句: コメント・NAG・変化手順の括弧・手数・結果・指し手
+_TOKEN = re.compile(r"\{[^}]*\}?|;[^\n]*|\$\d+|[()]|1-0|0-1|1/2-1/2|\*|\d+\.+|[^\s(){};$]+")
+_HEADER = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+_SAN = re.compile(r"^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$")
+_SAN_PIECES = {ch.upper(): p_type for ch, p_type in FEN_PIECES.items()}
+_PIECE_LETTERS = {p_type: ch for ch, p_type in _SAN_PIECES.items()}
+
+_CHUNK_MIN = 1 << 20  # 並列検証で 1 タスクに割り当てる最小バイト数
+
+
+class IllegalMoveError(ValueError):
+    """棋譜の指し手が局面で指せない（または読めない）"""
+
+    def __init__(self, san, ply, fen, reason="illegal move"):
+        super().__init__(f"ply {ply} {san!r}: {reason} in {fen}")
+        self.san = san
+        self.ply = ply
+        self.fen = fen
+        self.reason = reason
+
+
+class Game:
+    """PGN の 1 局分（タグ・SAN の指し手列・結果・ファイル内の開始位置）"""
+
+    def __init__(self, headers=None, moves=None, result="*", offset=0):
+        self.headers = headers if headers is not None else {}
+        self.moves = moves if moves is not None else []
+        self.result = result
+        self.offset = offset
+
+    @property
+    def start_fen(self):
+        """開始局面の FEN（FEN タグがなければ初期配置）"""
+        return self.headers.get("FEN", START_FEN)
+
+    def __str__(self):
+        white = self.headers.get("White", "?")
+        black = self.headers.get("Black", "?")
+        return f"{white} - {black} {self.result} ({len(self.moves)} plies, offset {self.offset})"
+
+
+def square_name(row, col):
+    return f"{'abcdefgh'[col]}{8 - row}"
+
+
+def _parse_movetext(text):
+    """指し手部分を (SAN のリスト, 結果) にする（コメント・NAG・変化手順は読み飛ばす）"""
+    moves = []
+    result = "*"
+    variation = 0
+    for token in _TOKEN.findall(text):
+        first = token[0]
+        if first == "(":
+            variation += 1
+        elif first == ")":
+            variation = max(0, variation - 1)
+        elif variation or first in "{;$" or token[-1] == ".":
+            continue
+        elif token in RESULTS:
+            result = token
+        else:
+            moves.append(token)
+    return moves, result
+
+
+def read_games(stream):
+    """バイナリで開いた PGN から Game を 1 局ずつ返すジェネレータ
+
+    指し手の後に現れたタグ行を次の局の始まりとする。offset は局の先頭のバイト位置。
+    """
+    headers = {}
+    movetext = []
+    offset = stream.tell()
+    start = None
+    in_moves = False
+    in_comment = False  # 複数行にわたる { } コメントの途中か
+    for raw in stream:
+        line = raw.decode("utf-8", "replace").strip()
+        if line.startswith("[") and not in_comment:
+            if in_moves:
+                yield Game(headers, *_parse_movetext("\n".join(movetext)), start)
+                headers, movetext, in_moves, start = {}, [], False, None
+            match = _HEADER.match(line)
+            if match:
+                headers[match.group(1)] = match.group(2).replace('\\"', '"').replace("\\\\", "\\")
+            if start is None:
+                start = offset
+        elif line and not line.startswith("%"):
+            if start is None:
+                start = offset
+            in_moves = True
+            movetext.append(line)
+            opening, closing = line.rfind("{"), line.rfind("}")
+            if opening != closing:
+                in_comment = opening > closing
+        offset += len(raw)
+    if start is not None:
+        yield Game(headers, *_parse_movetext("\n".join(movetext)), start)
+
+
+def read_fens(stream):
+    """テキストで開いたファイルから FEN（または EPD）を 1 行ずつ返す（空行と # 行は飛ばす）"""
+    for line in stream:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield line
+
+
+def parse_san(board, san):
+    """SAN を board の合法手 (from_row, from_col, to_row, to_col, 昇格駒) にする"""
+    text = san.rstrip("+#!?")
+    legal = board.get_legal_moves()
+    if text in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        to_col = 6 if len(text) == 3 else 2
+        candidates = [move for move in legal if move[3] == to_col and abs(move[1] - move[3]) == 2
+                      and board.board[move[0]][move[1]].type == PieceType.KING]
+    else:
+        match = _SAN.match(text)
+        if not match:
+            raise IllegalMoveError(san, len(board.undo_stack), board.to_fen(), "unreadable move")
+        letter, from_file, from_rank, to_square, promotion = match.groups()
+        p_type = _SAN_PIECES[letter] if letter else PieceType.PAWN
+        to_row, to_col = 8 - int(to_square[1]), ord(to_square[0]) - ord("a")
+        promotion = _SAN_PIECES[promotion] if promotion else None
+        candidates = []
+        for move in legal:
+            if move[2] != to_row or move[3] != to_col or move[4] != promotion:
+                continue
+            if board.board[move[0]][move[1]].type != p_type:
+                continue
+            if from_file and move[1] != ord(from_file) - ord("a"):
+                continue
+            if from_rank and move[0] != 8 - int(from_rank):
+                continue
+            candidates.append(move)
+    if len(candidates) != 1:
+        reason = "ambiguous move" if candidates else "illegal move"
+        raise IllegalMoveError(san, len(board.undo_stack), board.to_fen(), reason)
+    return candidates[0]
+
+
+def to_san(board, move):
+    """board の合法手 move を SAN にする（王手の + と詰みの # も付ける）"""
+    from_row, from_col, to_row, to_col, promotion = move
+    piece = board.board[from_row][from_col]
+    if piece.type == PieceType.KING and abs(to_col - from_col) == 2:
+        san = "O-O" if to_col == 6 else "O-O-O"
+    else:
+        capture = (board.board[to_row][to_col] is not None or
+                   (piece.type == PieceType.PAWN and board.en_passant_target == (to_row, to_col)))
+        if piece.type == PieceType.PAWN:
+            san = "abcdefgh"[from_col] + "x" if capture else ""
+        else:
+            # 同じ種類の駒が同じマスへ行けるときは筋、それでも曖昧なら段、両方で区別する
+            others = [m for m in board.get_legal_moves()
+                      if m[2:4] == (to_row, to_col) and m[:2] != (from_row, from_col)
+                      and board.board[m[0]][m[1]].type == piece.type]
+            san = _PIECE_LETTERS[piece.type]
+            if others:
+                if all(m[1] != from_col for m in others):
+                    san += "abcdefgh"[from_col]
+                elif all(m[0] != from_row for m in others):
+                    san += str(8 - from_row)
+                else:
+                    san += square_name(from_row, from_col)
+            if capture:
+                san += "x"
+        san += square_name(to_row, to_col)
+        if promotion:
+            san += "=" + _PIECE_LETTERS[promotion]
+
+    board.make_move(*move)
+    if board.is_in_check():
+        san += "+" if board.get_legal_moves() else "#"
+    board.unmake_move()
+    return san
+
+
+def replay(game):
+    """game を開始局面から make_move で指し直し、(最終局面の ChessBoard, 手のリスト) を返す
+
+    指せない手があれば IllegalMoveError を送出する。
+    """
+    board = ChessBoard(game.start_fen)
+    moves = []
+    for san in game.moves:
+        move = parse_san(board, san)
+        board.make_move(*move)
+        moves.append(move)
+    return board, moves
+
+
+def format_pgn(headers, moves, start_fen=None, result=None):
+    """タグの辞書と指し手（ChessBoard の手のタプル）の列を PGN 文字列にする"""
+    board = ChessBoard(start_fen)
+    headers = dict(headers)
+    result = result or headers.get("Result", "*")
+    headers["Result"] = result
+    if start_fen and start_fen != START_FEN:
+        headers["SetUp"] = "1"
+        headers["FEN"] = start_fen
+    tags = "".join(f'[{key} "{value}"]\n' for key, value in headers.items())
+
+    # 黒番から始まる局面は "1..." から書き始める
+    number = 1
+    tokens = []
+    if board.current_turn == PieceColor.BLACK:
+        tokens.append(f"{number}...")
+    for move in moves:
+        if board.current_turn == PieceColor.WHITE:
+            tokens.append(f"{number}.")
+        tokens.append(to_san(board, move))
+        if board.current_turn == PieceColor.BLACK:
+            number += 1
+        board.make_move(*move)
+    tokens.append(result)
+
+    lines = []
+    line = ""
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > 79:
+            lines.append(line)
+            line = token
+        else:
+            line = f"{line} {token}" if line else token
+    lines.append(line)
+    return tags + "\n" + "\n".join(lines) + "\n\n"
+
+
+def write_game(out, game, moves=None):
+    """game を整形し直して out に書き出す（moves は replay で得た手のリスト）"""
+    if moves is None:
+        moves = replay(game)[1]
+    start_fen = game.start_fen if "FEN" in game.headers else None
+    out.write(format_pgn(game.headers, moves, start_fen, game.result))
+
+
+def check_fen(fen):
+    """FEN が局面として正しければ None、おかしければ理由の文字列を返す"""
+    fields = fen.split()
+    if len(fields) < 4:
+        return "too few fields"
+    ranks = fields[0].split("/")
+    if len(ranks) != 8:
+        return "expected 8 ranks"
+    for rank in ranks:
+        width = 0
+        for ch in rank:
+            if ch.isdigit():
+                width += int(ch)
+            elif ch.lower() in FEN_PIECES:
+                width += 1
+            else:
+                return f"bad piece letter {ch!r}"
+        if width != 8:
+            return f"rank {rank!r} is not 8 squares"
+    if fields[1] not in ("w", "b"):
+        return f"bad side to move {fields[1]!r}"
+    if fields[0].count("K") != 1 or fields[0].count("k") != 1:
+        return "each side needs exactly one king"
+    if any(ch in ranks[0] + ranks[7] for ch in "Pp"):
+        return "pawn on the first or last rank"
+    if fields[3] != "-" and not re.fullmatch(r"[a-h][36]", fields[3]):
+        return f"bad en passant square {fields[3]!r}"
+
+    board = ChessBoard(fen)
+    waiting = PieceColor.BLACK if board.current_turn == PieceColor.WHITE else PieceColor.WHITE
+    if board.is_in_check(waiting):
+        return "side not to move is in check"
+    return None
+
+
+def write_fens(out, boards):
+    """ChessBoard の列を 1 行 1 局面の FEN として書き出す"""
+    for board in boards:
+        out.write(board.to_fen() + "\n")
+
+
+def _read_range(path, start, end, is_pgn):
+    """path の [start, end) に先頭がある局（FEN は (行の位置, 行)）を順に返す
+
+    範囲の途中から読み始めるときは、PGN なら次の [Event タグ、FEN なら次の行まで飛ばす。
+    範囲の末尾をまたぐ局は最後まで読む。
+    """
+    with open(path, "rb") as stream:
+        if start > 0:
+            stream.seek(start - 1)
+            stream.readline()  # 途中から始まる行を飛ばす
+        if not is_pgn:
+            while stream.tell() < end:
+                offset = stream.tell()
+                raw = stream.readline()
+                if not raw:
+                    return  # ファイルの終わり
+                line = raw.decode("utf-8", "replace").strip()
+                if line and not line.startswith("#"):
+                    yield offset, line
+            return
+        if start > 0:
+            while True:
+                position = stream.tell()
+                line = stream.readline()
+                if not line or line.startswith(b"[Event "):
+                    stream.seek(position)
+                    break
+        for game in read_games(stream):
+            if game.offset >= end and next(iter(game.headers), None) == "Event":
+                return
+            yield game
+
+
+def validate_range(path, start, end, is_pgn=True):
+    """ワーカー: [start, end) の局を検証し (局数, 手数, 誤りのリスト) を返す
+
+    誤りは (開始バイト位置, 局の説明, 理由) のタプル。
+    """
+    games = moves = 0
+    errors = []
+    if is_pgn:
+        for game in _read_range(path, start, end, True):
+            games += 1
+            try:
+                replay(game)
+                moves += len(game.moves)
+            except IllegalMoveError as error:
+                moves += error.ply
+                errors.append((game.offset, str(game), str(error)))
+            except (KeyError, ValueError, IndexError) as error:
+                errors.append((game.offset, str(game), f"bad FEN tag: {error}"))
+    else:
+        for offset, fen in _read_range(path, start, end, False):
+            games += 1
+            try:
+                reason = check_fen(fen)
+            except (KeyError, ValueError, IndexError) as error:
+                reason = str(error)
+            if reason:
+                errors.append((offset, fen, reason))
+    return games, moves, errors
+
+
+def validate_file(path, workers=1, is_pgn=None):
+    """path を並列に検証し、(局数, 手数, 誤りのリスト, 経過秒) を返す"""
+    if is_pgn is None:
+        is_pgn = not path.lower().endswith((".fen", ".epd"))
+    size = os.path.getsize(path)
+    start_time = time.perf_counter()
+    if workers <= 1:
+        games, moves, errors = validate_range(path, 0, size, is_pgn)
+        return games, moves, errors, time.perf_counter() - start_time
+
+    # プロセスプールは並列に検証するときだけ読み込む（読み込みに時間がかかる）
+    from concurrent.futures import ProcessPoolExecutor
+
+    # ワーカー数より多めに区切り、遅い範囲があっても他のワーカーが次を取れるようにする
+    chunk = max(_CHUNK_MIN, -(-size // (workers * 8)))
+    starts = range(0, size, chunk)
+    games = moves = 0
+    errors = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(validate_range, path, start, start + chunk, is_pgn)
+                   for start in starts]
+        for future in futures:
+            range_games, range_moves, range_errors = future.result()
+            games += range_games
+            moves += range_moves
+            errors.extend(range_errors)
+    return games, moves, errors, time.perf_counter() - start_time
+
+
+def export(path, out, fen=False):
+    """PGN を読み直して、整形した PGN（fen=True なら各局の最終局面の FEN）を書き出す"""
+    with open(path, "rb") as stream:
+        for game in read_games(stream):
+            try:
+                board, moves = replay(game)
+            except (IllegalMoveError, KeyError, ValueError, IndexError) as error:
+                print(f"skip {game}: {error}", file=sys.stderr)
+                continue
+            if fen:
+                write_fens(out, [board])
+            else:
+                write_game(out, game, moves)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PGN / FEN ファイルの検証と書き出し")
+    sub = parser.add_subparsers(dest="command", required=True)
+    check = sub.add_parser("validate", help="全局を指し直して不正な手を報告")
+    check.add_argument("path", help="PGN ファイル（.fen / .epd は 1 行 1 局面）")
+    check.add_argument("--workers", type=int, default=os.cpu_count(),
+                       help="検証に使うプロセス数")
+    write = sub.add_parser("export", help="指し直した棋譜を PGN または FEN で書き出す")
+    write.add_argument("path", help="PGN ファイル")
+    write.add_argument("--fen", action="store_true", help="各局の最終局面を FEN で書き出す")
+    write.add_argument("-o", "--output", help="出力先（省略時は標準出力）")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as out:
+                export(args.path, out, args.fen)
+        else:
+            export(args.path, sys.stdout, args.fen)
+        return 0
+
+    games, moves, errors, elapsed = validate_file(args.path, args.workers)
+    for offset, description, reason in errors:
+        print(f"offset {offset}: {description}: {reason}")
+    rate = games / elapsed if elapsed > 0 else 0.0
+    print(f"{games} games  {moves} moves  {len(errors)} errors  {elapsed:.2f}s  "
+          f"{rate:,.0f} games/s  ({args.workers} workers)")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+# 人が考えている間の先読み（別プロセスで局面を解析し、最善手のヒントを返す）
+#
+# 探索は別プロセスで行うので、ゲームの描画ループ（FPS）を止めない。コンピュータ自身の手も
+# 同じワーカーで、持ち時間・ノード数を決めて探索する。局面は FEN 文字列で
+# キューに送り、深さごとの SearchResult を結果のキューで返す。局面ごとに世代番号を
+# 振って共有メモリ（multiprocessing.Value）に置き、ワーカーの探索はノード数の確認の
+# たびにそれを見て、世代が変わったら（手が指されたら）すぐに打ち切る。置換表は
+# ワーカーの Searcher が持ち続けるので、次の局面の解析は前の解析の結果を使い回せる。
+import copy
+import multiprocessing
+import os
+import queue
+
+from core import ChessBoard
+from search import Searcher
+
+
+class _CancellableSearcher(Searcher):
+    """世代番号が変わったら止まる Searcher"""
+
+    def __init__(self, current, book=None):
+        super().__init__(book=book)
+        self.current = current
+        self.generation = 0
+
+    def _check_limits(self):
+        super()._check_limits()
+        if self.current.value != self.generation:
+            self.stopped = True
+
+
+def _ponder_worker(requests, results, current, book_path=None):
+    """ワーカー: (世代, FEN, 持ち時間, ノード数) を受け取るたびに解析する（None で終了）
+
+    深さごとに (世代, 結果, False) を、終わったら（打ち切りも含む）(世代, 最終結果, True) を返す。
+    """
+    if hasattr(os, "nice"):
+        os.nice(10)  # 描画するメインプロセスを優先させる
+    book = None
+    if book_path:
+        from book import OpeningBook
+        book = OpeningBook(book_path)
+    searcher = _CancellableSearcher(current, book)
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        generation, fen, time_limit, max_nodes = request
+        if generation != current.value:
+            continue  # 届く前に次の局面になった
+        searcher.generation = generation
+
+        def report(result):
+            # キューは後で（別スレッドで）pickle するので、書き換えられる前に写しておく
+            results.put((generation, copy.copy(result), False))
+
+        result = searcher.search(ChessBoard(fen), time_limit=time_limit, max_nodes=max_nodes,
+                                 callback=report)
+        results.put((generation, result, True))
+
+
+class Ponderer:
+    """先読みのワーカープロセスを 1 つ持ち、最新の局面の解析結果を受け取る
+
+    book（定跡ファイル）を渡すと、ワーカーは定跡にある局面では探索せずに定跡手を返す。
+    """
+
+    def __init__(self, book=None):
+        self.current = multiprocessing.Value("q", 0)
+        self.requests = multiprocessing.Queue()
+        self.results = multiprocessing.Queue()
+        self.process = multiprocessing.Process(
+            target=_ponder_worker, args=(self.requests, self.results, self.current, book),
+            daemon=True)
+        self.process.start()
+        self.generation = 0
+        self.result = None  # 今の局面の一番深い結果
+        self.running = False
+        self.finished = False  # 今の局面の探索が終わり、result が最終結果か
+
+    def analyse(self, board, time_limit=None, max_nodes=None):
+        """board の解析を始める（前の局面の解析は打ち切る）
+
+        time_limit 秒か max_nodes ノードで止まる（どちらも None なら打ち切るまで続ける）。
+        """
+        self._next_generation()
+        self.requests.put((self.generation, board.to_fen(), time_limit, max_nodes))
+        self.running = True
+
+    def stop(self):
+        """解析を打ち切る"""
+        self._next_generation()
+
+    def _next_generation(self):
+        self.generation += 1
+        self.current.value = self.generation
+        self.result = None
+        self.running = False
+        self.finished = False
+
+    def poll(self):
+        """届いた結果を取り込み、今の局面の結果が変わったかを返す（待たない）"""
+        updated = False
+        while True:
+            try:
+                generation, result, done = self.results.get_nowait()
+            except queue.Empty:
+                return updated
+            if generation != self.generation:
+                continue  # 前の局面の結果
+            if done:
+                self.running = False
+                self.finished = True
+            self.result = result
+            updated = True
+
+    def close(self):
+        """ワーカープロセスを終了"""
+        self.stop()
+        self.requests.put(None)
+        self.process.join(1.0)
+        if self.process.is_alive():
+            self.process.terminate()
@@ -0,0 +1,245 @@
+# 局面から棋譜を引く索引（どの局がこの局面になり、次に何を指したか）
+#
+# アーカイブ（.chga）の各局を make_move で指し直し、各局面の Zobrist キーを記録する。
+# ファイルの構成（リトルエンディアン）:
+#   ヘッダ       : マジック "CHPI", 版数 u16, 予約 u16
+#   セグメント … : マジック "SEGM", 最初の局番号 u32, 局数 u32, レコード数 u64,
+#                  レコード（局面キー u64, 局番号 u32, 手数 u16, 次の手 u16）× レコード数
+# セグメントの中はキーの昇順に並ぶ。新しい局はセグメントとして末尾に書き足すだけなので、
+# 既存の部分は書き直さない。引くときは mmap して各セグメントを二分探索する。
+# セグメントが増えたら compact で 1 つにまとめる（各セグメントを順に読みながらマージする）。
+# 次の手は archive.encode_move の 16 ビット。局の最後の局面は NO_MOVE にする。
+import argparse
+import heapq
+import mmap
+import os
+import struct
+import sys
+import time
+from collections import Counter
+
+from archive import Archive, decode_move
+from core import ChessBoard, move_name
+
+MAGIC = b"CHPI"
+SEGMENT_MAGIC = b"SEGM"
+VERSION = 1
+NO_MOVE = 0xFFFF
+
+GAMES_PER_SEGMENT = 4096  # 1 つのセグメント（1 つのワーカーの仕事）にまとめる局数
+MAX_SEGMENTS = 16  # 追記でこれより増えたら compact する
+
+_HEADER = struct.Struct("<4sHH")
+_SEGMENT = struct.Struct("<4sIIQ")
+_RECORD = struct.Struct("<QIHH")
+_KEY = struct.Struct("<Q")
+_READ_RECORDS = 1 << 16  # compact で一度に読むレコード数
+
+
+class Segment:
+    """ファイル中の 1 つのセグメントの位置"""
+
+    def __init__(self, start, first_game, games, count):
+        self.start = start  # 最初のレコードの位置
+        self.first_game = first_game
+        self.games = games
+        self.count = count
+
+
+class PositionIndex:
+    """mmap した索引ファイルを局面キーで引く"""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _ = _HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a position index: {path}")
+        self.segments = []
+        position = _HEADER.size
+        while position + _SEGMENT.size <= len(self.data):
+            magic, first_game, games, count = _SEGMENT.unpack_from(self.data, position)
+            end = position + _SEGMENT.size + count * _RECORD.size
+            if magic != SEGMENT_MAGIC or end > len(self.data):
+                break  # 書きかけのセグメント（中断した追記）は使わない
+            self.segments.append(Segment(position + _SEGMENT.size, first_game, games, count))
+            position = end
+        self.end = position  # 最後の完全なセグメントの終わり
+
+    def close(self):
+        self.data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        """レコード数"""
+        return sum(segment.count for segment in self.segments)
+
+    @property
+    def games(self):
+        """索引に入っている局数（0 局目から続けて入っている）"""
+        return max((segment.first_game + segment.games for segment in self.segments), default=0)
+
+    def _key_at(self, segment, index):
+        return _KEY.unpack_from(self.data, segment.start + index * _RECORD.size)[0]
+
+    def lookup(self, key):
+        """key の局面のレコード (局番号, 手数, 次の手の 16 ビット) のリストを局番号の順に返す"""
+        entries = []
+        for segment in self.segments:
+            lo, hi = 0, segment.count
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if self._key_at(segment, mid) < key:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            position = segment.start + lo * _RECORD.size
+            for _ in range(lo, segment.count):
+                record_key, game, ply, code = _RECORD.unpack_from(self.data, position)
+                if record_key != key:
+                    break
+                entries.append((game, ply, code))
+                position += _RECORD.size
+        entries.sort()
+        return entries
+
+    def next_moves(self, board):
+        """board の局面の次の手ごとの回数を [(手のタプルまたは None, 回数), ...] で返す（多い順）"""
+        return count_moves(self.lookup(board.zobrist_key))
+
+    def records(self, segment):
+        """segment のレコードを先頭から順に返す（少しずつ読む）"""
+        position = segment.start
+        end = segment.start + segment.count * _RECORD.size
+        while position < end:
+            chunk = min(end, position + _READ_RECORDS * _RECORD.size)
+            yield from _RECORD.iter_unpack(self.data[position:chunk])
+            position = chunk
+
+
+def count_moves(entries):
+    """lookup の結果を次の手ごとに数える（多い順。局の終わりは None）"""
+    counts = Counter(code for _, _, code in entries)
+    return [(None if code == NO_MOVE else decode_move(code), count)
+            for code, count in counts.most_common()]
+
+
+def _index_games(archive_path, first, last):
+    """ワーカー: アーカイブの first 〜 last - 1 局目を指し直し、セグメントを bytes で返す"""
+    records = []
+    with Archive(archive_path) as archive:
+        decoded = archive.decoded
+        for number in range(first, last):
+            start_fen, _, codes = archive.codes(number)
+            board = ChessBoard(start_fen)
+            for ply, code in enumerate(codes):
+                records.append((board.zobrist_key, number, ply, code))
+                board.make_move(*decoded[code])
+            records.append((board.zobrist_key, number, len(codes), NO_MOVE))
+    records.sort()
+    pack = _RECORD.pack
+    return (_SEGMENT.pack(SEGMENT_MAGIC, first, last - first, len(records)) +
+            b"".join([pack(*record) for record in records]))
+
+
+def update(archive_path, index_path, workers=1):
+    """アーカイブのうち索引にまだない局を指し直して索引に書き足す。(追加した局数, 秒) を返す"""
+    start_time = time.perf_counter()
+    if not os.path.exists(index_path):
+        with open(index_path, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, 0))
+    with PositionIndex(index_path) as index:
+        first = index.games
+        segments = len(index.segments)
+        end = index.end
+    with Archive(archive_path) as archive:
+        last = len(archive)
+    ranges = [(start, min(last, start + GAMES_PER_SEGMENT))
+              for start in range(first, last, GAMES_PER_SEGMENT)]
+
+    with open(index_path, "r+b") as out:
+        out.seek(end)
+        out.truncate()  # 中断した追記の残りを捨てる
+        if workers <= 1 or len(ranges) <= 1:
+            for start, end in ranges:
+                out.write(_index_games(archive_path, start, end))
+        else:
+            # プロセスプールは並列に作るときだけ読み込む（読み込みに時間がかかる）
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                # 局番号の順に書く（索引は 0 局目から続けて入っている前提）
+                for data in pool.map(_index_games, [archive_path] * len(ranges),
+                                     *zip(*ranges)):
+                    out.write(data)
+    if segments + len(ranges) > MAX_SEGMENTS:
+        compact(index_path)
+    return last - first, time.perf_counter() - start_time
+
+
+def compact(index_path):
+    """全てのセグメントをマージして 1 つにする（一時ファイルに書いてから置き換える）"""
+    temp_path = index_path + ".tmp"
+    with PositionIndex(index_path) as index:
+        if len(index.segments) <= 1:
+            return
+        with open(temp_path, "wb") as out:
+            out.write(_HEADER.pack(MAGIC, VERSION, 0))
+            out.write(_SEGMENT.pack(SEGMENT_MAGIC, 0, index.games, len(index)))
+            pack = _RECORD.pack
+            batch = []
+            for record in heapq.merge(*(index.records(segment) for segment in index.segments)):
+                batch.append(pack(*record))
+                if len(batch) >= _READ_RECORDS:
+                    out.write(b"".join(batch))
+                    batch = []
+            out.write(b"".join(batch))
+    os.replace(temp_path, index_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="局面から棋譜を引く索引の作成と検索")
+    sub = parser.add_subparsers(dest="command", required=True)
+    make = sub.add_parser("update", help="アーカイブのまだ索引にない局を書き足す（なければ作る）")
+    make.add_argument("archive", help="棋譜のアーカイブ（.chga）")
+    make.add_argument("index", help="索引ファイル")
+    make.add_argument("--workers", type=int, default=os.cpu_count(), help="指し直しに使うプロセス数")
+    merge = sub.add_parser("compact", help="セグメントを 1 つにまとめる")
+    merge.add_argument("index")
+    query = sub.add_parser("query", help="局面に到達した局と次の手を表示")
+    query.add_argument("index")
+    query.add_argument("--fen", help="調べる局面（省略時は初期配置）")
+    query.add_argument("--games", type=int, default=10, help="表示する局の数")
+    args = parser.parse_args(argv)
+
+    if args.command == "update":
+        added, elapsed = update(args.archive, args.index, args.workers)
+        with PositionIndex(args.index) as index:
+            print(f"{added} games added  {elapsed:.2f}s  "
+                  f"({index.games} games, {len(index)} positions, {len(index.segments)} segments)")
+        return 0
+    if args.command == "compact":
+        compact(args.index)
+        return 0
+
+    board = ChessBoard(args.fen)
+    with PositionIndex(args.index) as index:
+        start = time.perf_counter()
+        entries = index.lookup(board.zobrist_key)
+        moves = count_moves(entries)
+        elapsed = time.perf_counter() - start
+    games = list(dict.fromkeys(game for game, _, _ in entries))
+    print(f"{len(games)} games  {len(entries)} positions  {elapsed * 1e3:.2f} ms")
+    for move, count in moves:
+        print(f"  {move_name(move) if move else '(end)'} {count}")
+    for game, ply, _ in entries[:args.games]:
+        print(f"  game {game} ply {ply}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,212 @@
+# ホットパスの計測（呼び出し回数・合計時間・最大時間）と JSON / CSV への書き出し
+#
+# enable() で chess のメソッドを計測つきのものに差し替える。差し替えるまでは元の
+# メソッドのままなので、計測しない普段の実行には余分な処理が入らない。
+# ウィンドウ版は `python chess.py --profile stats.json`（F3 でオーバーレイ表示）、
+# ウィンドウなしは `python selfplay.py ... --profile stats.csv` で書き出す。
+# `python profiler.py startup` は各モジュールを新しいインタプリタで読み込み、起動時間を測る。
+import argparse
+import csv
+import functools
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# 計測するメソッド（モジュール名, クラス名, メソッド名）。記録はメソッド名で行う
+HOT_PATHS = [
+    ("core", "Piece", "get_possible_moves"),
+    ("core", "ChessBoard", "get_legal_moves"),
+    ("core", "ChessBoard", "make_move"),
+    ("core", "ChessBoard", "select_piece"),
+    ("chess", "ChessGame", "draw_board"),
+    ("chess", "ChessGame", "draw_pieces"),
+    ("chess", "ChessGame", "draw_info"),
+]
+
+# オーバーレイで「移動生成」としてまとめて表示するもの
+MOVE_GENERATION = ("get_possible_moves", "get_legal_moves")
+
+FIELDS = ("name", "calls", "total_ms", "mean_us", "max_us")
+
+# 起動時間を測るモジュール（CLI ツールとワーカーが読み込むもの、最後にウィンドウ版）
+STARTUP_MODULES = ["core", "search", "pgn", "archive", "book", "tablebase", "selfplay",
+                   "server", "chess"]
+
+# 新しいインタプリタで実行し、最後の行に (import の秒, pygame を読み込んだか) を出す
+_IMPORT_CODE = ("import sys, time; start = time.perf_counter(); import {module}; "
+                "print(time.perf_counter() - start, 'pygame' in sys.modules)")
+_WINDOW_CODE = ("import sys, time; start = time.perf_counter(); import chess, pygame; "
+                "game = chess.ChessGame(); pygame.display.update(game.render()); "
+                "print(time.perf_counter() - start, 'pygame' in sys.modules)")
+
+
+class Timer:
+    """1 つの計測対象の呼び出し回数・合計・最大（秒）"""
+
+    __slots__ = ("calls", "total", "max")
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+
+
+class Profiler:
+    """名前ごとの Timer を持ち、メソッドの差し替えと書き出しを行う"""
+
+    def __init__(self):
+        self.timers = {}
+        self.patched = []
+        self.started = time.perf_counter()
+
+    def add(self, name, elapsed):
+        """name の 1 回分として elapsed 秒を記録する"""
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = Timer()
+        timer.calls += 1
+        timer.total += elapsed
+        if elapsed > timer.max:
+            timer.max = elapsed
+
+    def wrap(self, owner, name):
+        """owner.name を計測つきの関数に差し替える（二重には差し替えない）"""
+        original = owner.__dict__[name]
+        if getattr(original, "__wrapped__", None) is not None:
+            return
+        add = self.add
+        perf_counter = time.perf_counter
+
+        @functools.wraps(original)
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                add(name, perf_counter() - start)
+
+        setattr(owner, name, timed)
+        self.patched.append((owner, name, original))
+
+    def unpatch(self):
+        """差し替えたメソッドを元に戻す"""
+        for owner, name, original in reversed(self.patched):
+            setattr(owner, name, original)
+        self.patched = []
+
+    def reset(self):
+        self.timers = {}
+        self.started = time.perf_counter()
+
+    def total(self, names):
+        """names の (呼び出し回数の合計, 合計時間) を返す"""
+        timers = [self.timers[name] for name in names if name in self.timers]
+        return sum(timer.calls for timer in timers), sum(timer.total for timer in timers)
+
+    def rows(self):
+        """FIELDS の順の行（合計時間の降順）"""
+        rows = []
+        for name, timer in sorted(self.timers.items(), key=lambda item: -item[1].total):
+            rows.append((name, timer.calls, timer.total * 1e3,
+                         timer.total / timer.calls * 1e6 if timer.calls else 0.0,
+                         timer.max * 1e6))
+        return rows
+
+    def snapshot(self):
+        """計測結果の辞書（JSON にそのまま書ける）"""
+        return {
+            "elapsed": time.perf_counter() - self.started,
+            "timers": {row[0]: dict(zip(FIELDS[1:], row[1:])) for row in self.rows()},
+        }
+
+    def merge(self, snapshot):
+        """別プロセスの snapshot() の結果を足し込む"""
+        for name, values in snapshot["timers"].items():
+            timer = self.timers.get(name)
+            if timer is None:
+                timer = self.timers[name] = Timer()
+            timer.calls += values["calls"]
+            timer.total += values["total_ms"] / 1e3
+            timer.max = max(timer.max, values["max_us"] / 1e6)
+
+    def write(self, path):
+        """path の拡張子が .csv なら CSV、それ以外は JSON で書き出す"""
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            if path.lower().endswith(".csv"):
+                writer = csv.writer(f)
+                writer.writerow(FIELDS)
+                for row in self.rows():
+                    writer.writerow([row[0], row[1]] + [f"{value:.3f}" for value in row[2:]])
+            else:
+                json.dump(self.snapshot(), f, indent=2)
+
+
+# プロセスに 1 つの計測器
+PROFILER = Profiler()
+
+
+def enable(profiler=PROFILER, game_class=None):
+    """HOT_PATHS のメソッドを計測つきにして profiler を返す
+
+    ウィンドウ版（chess）のメソッドは game_class（ChessGame が自分のクラスを渡す）か、
+    chess が読み込まれていればその ChessGame に差し替える（ウィンドウなしのツールで
+    pygame を読み込まないため。`python chess.py` では chess ではなく __main__ になる）。
+    """
+    import core
+    chess = sys.modules.get("chess")
+    for module_name, class_name, method in HOT_PATHS:
+        if module_name == "core":
+            owner = getattr(core, class_name)
+        elif game_class is not None:
+            owner = game_class
+        elif chess is not None:
+            owner = getattr(chess, class_name)
+        else:
+            continue
+        profiler.wrap(owner, method)
+    return profiler
+
+
+def measure_startup(code, runs=5):
+    """code を新しいインタプリタで runs 回実行し、(全体の秒, 計測区間の秒, pygame を読み込んだか)
+    の中央値を返す"""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    totals = []
+    sections = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, "-c", code], cwd=directory, check=True,
+                                capture_output=True, text=True).stdout
+        totals.append(time.perf_counter() - start)
+        seconds, pygame_loaded = output.split()[-2:]
+        sections.append(float(seconds))
+    return statistics.median(totals), statistics.median(sections), pygame_loaded == "True"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="計測の補助ツール")
+    sub = parser.add_subparsers(dest="command", required=True)
+    startup = sub.add_parser("startup", help="モジュールの読み込みと起動にかかる時間を測る")
+    startup.add_argument("modules", nargs="*", help="測るモジュール（省略時は主なもの全て）")
+    startup.add_argument("--runs", type=int, default=5, help="それぞれ何回測って中央値をとるか")
+    startup.add_argument("--window", action="store_true",
+                         help="ウィンドウを開いて最初の 1 フレームを描くまでも測る")
+    args = parser.parse_args(argv)
+
+    targets = [(module, _IMPORT_CODE.format(module=module))
+               for module in args.modules or STARTUP_MODULES]
+    if args.window:
+        targets.append(("(window)", _WINDOW_CODE))
+    print(f"{'module':<12} {'process ms':>10} {'import ms':>10}  pygame")
+    for name, code in targets:
+        total, section, pygame_loaded = measure_startup(code, args.runs)
+        print(f"{name:<12} {total * 1e3:>10.1f} {section * 1e3:>10.1f}  "
+              f"{'yes' if pygame_loaded else 'no'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,341 @@
+# 反復深化アルファベータ探索（コンピュータ側の指し手を決める）
+#
+# 合法手で探索し、チェックメイトを負け（-MATE）、ステイルメイトを 0 とする。
+# 時間かノード数の上限に達したら、最後に完了した深さの最善手を返す。
+import argparse
+import sys
+import time
+
+from core import ChessBoard, PieceType, move_name
+from evaluation import MATERIAL, evaluate
+from zobrist import EXACT, LOWER, UPPER, TranspositionTable
+
+MATE = 100000
+INF = 1000000
+MAX_PLY = 64
+
+# 並べ替えの優先度
+_TT_MOVE_SCORE = 1 << 30
+_CAPTURE_SCORE = 1 << 20
+_KILLER_SCORES = (1 << 19, 1 << 18)
+
+_CHECK_INTERVAL = 512  # 時間切れを確認するノード間隔
+
+
+def _score_to_table(score, ply):
+    """詰みの値を置換表用に「その局面から何手で詰むか」に直す（ルートからの手数を除く）"""
+    if score >= MATE - MAX_PLY:
+        return score + ply
+    if score <= -(MATE - MAX_PLY):
+        return score - ply
+    return score
+
+
+def _score_from_table(score, ply):
+    """_score_to_table の逆（置換表の値をルートから ply 手の局面の値にする）"""
+    if score >= MATE - MAX_PLY:
+        return score - ply
+    if score <= -(MATE - MAX_PLY):
+        return score + ply
+    return score
+
+
+class SearchResult:
+    """探索結果（最善手・評価値・到達深さ・ノード数など）"""
+
+    def __init__(self):
+        self.move = None
+        self.score = 0
+        self.depth = 0
+        self.nodes = 0
+        self.elapsed = 0.0
+        self.pv = []
+        self.book = False  # 定跡から選んだ手か
+
+    @property
+    def nps(self):
+        """1 秒あたりの探索ノード数"""
+        return self.nodes / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self):
+        if self.book:
+            return f"book move {move_name(self.move)}"
+        pv = " ".join(move_name(move) for move in self.pv)
+        return (f"depth {self.depth} score {self.score} nodes {self.nodes} "
+                f"time {self.elapsed:.2f}s nps {self.nps:,.0f} pv {pv}")
+
+
+def book_result(book, board, start):
+    """定跡に board の手があればそれを SearchResult にして返す（なければ None）"""
+    move = book.choose(board) if book else None
+    if move is None:
+        return None
+    result = SearchResult()
+    result.move = move
+    result.pv = [move]
+    result.book = True
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+class Searcher:
+    """置換表とキラームーブを持つアルファベータ探索（book があれば先に定跡を引く）"""
+
+    def __init__(self, table_size=1 << 18, book=None):
+        self.table = TranspositionTable(table_size)
+        self.book = book
+        self.killers = [[None, None] for _ in range(MAX_PLY + 1)]
+        self.board = None
+        self.nodes = 0
+        self.stopped = False
+        self.deadline = None
+        self.max_nodes = None
+        self.next_check = 0
+        self.root_move = None
+
+    def search(self, board, time_limit=1.0, max_nodes=None, max_depth=MAX_PLY, callback=None):
+        """board の手番側の最善手を探す（board は探索後に元の局面へ戻る）
+
+        time_limit 秒または max_nodes ノードで打ち切る。callback には深さごとの
+        SearchResult が渡される。定跡にある局面では探索せずに定跡手を返す。
+        max_depth は MAX_PLY までに切り詰める（キラームーブの表が MAX_PLY 手分しかない）。
+        """
+        start = time.perf_counter()
+        max_depth = min(max_depth, MAX_PLY)
+        result = book_result(self.book, board, start)
+        if result:
+            return result
+        self._prepare(board, start + time_limit if time_limit else None, max_nodes)
+
+        result = SearchResult()
+        root_moves = board.get_legal_moves()
+        if not root_moves:
+            return result
+        result.move = root_moves[0]
+
+        for depth in range(1, max_depth + 1):
+            score = self._negamax(depth, -INF, INF, 0)
+            if self.stopped:
+                break  # 途中で打ち切った深さの結果は使わない
+            result.move = self.root_move
+            result.score = score
+            result.depth = depth
+            result.nodes = self.nodes
+            result.elapsed = time.perf_counter() - start
+            result.pv = self._principal_variation(depth)
+            if callback:
+                callback(result)
+            if abs(score) >= MATE - MAX_PLY:
+                break  # キングを取る／取られる手順が見つかった
+            # 次の深さを終えられそうになければ始めない
+            if self.deadline and time.perf_counter() + result.elapsed * 2 > self.deadline:
+                break
+
+        result.nodes = self.nodes
+        result.elapsed = time.perf_counter() - start
+        return result
+
+    def score_move(self, board, move, depth, alpha=-INF, beta=INF, deadline=None):
+        """ルートの 1 手 move を指した後を depth - 1 手読み、手番側から見た評価値を返す
+
+        (alpha, beta) の外側の値は上界・下界としてだけ意味を持つ。deadline
+        （time.perf_counter の時刻）を過ぎたら打ち切り、stopped が True になる。
+        """
+        self._prepare(board, deadline, None)
+        board.make_move(*move)
+        if board.winner:
+            score = MATE
+        else:
+            score = -self._negamax(depth - 1, -beta, -alpha, 1)
+        board.unmake_move()
+        return score
+
+    def _prepare(self, board, deadline, max_nodes):
+        """探索ごとのカウンタと上限を初期化"""
+        self.board = board
+        self.nodes = 0
+        self.stopped = False
+        self.deadline = deadline
+        self.max_nodes = max_nodes
+        self.next_check = _CHECK_INTERVAL
+        self.killers = [[None, None] for _ in range(MAX_PLY + 1)]
+        self.table.new_search()
+
+    def _check_limits(self):
+        """時間・ノード数の上限を超えていたら探索を止める"""
+        self.next_check = self.nodes + _CHECK_INTERVAL
+        if self.max_nodes and self.nodes >= self.max_nodes:
+            self.stopped = True
+        elif self.deadline and time.perf_counter() >= self.deadline:
+            self.stopped = True
+
+    def _negamax(self, depth, alpha, beta, ply):
+        """手番側から見た評価値を返す"""
+        self.nodes += 1
+        if self.nodes >= self.next_check:
+            self._check_limits()
+        if depth <= 0:
+            return self._quiesce(alpha, beta, ply)
+
+        board = self.board
+        key = board.zobrist_key
+        entry = self.table.probe(key)
+        tt_move = None
+        if entry is not None:
+            tt_move = entry[4]
+            if ply > 0 and entry[1] >= depth:
+                score, flag = _score_from_table(entry[2], ply), entry[3]
+                if (flag == EXACT or (flag == LOWER and score >= beta) or
+                        (flag == UPPER and score <= alpha)):
+                    return score
+
+        moves = board.get_legal_moves()
+        if not moves:
+            # チェックメイトなら負け、ステイルメイトなら引き分け
+            return -(MATE - ply) if board.is_in_check() else 0
+
+        alpha_orig = alpha
+        best_score = -INF
+        best_move = None
+        for move in self._order_moves(moves, tt_move, ply):
+            board.make_move(*move)
+            if board.winner:
+                score = MATE - ply  # キングを取った
+            else:
+                score = -self._negamax(depth - 1, -beta, -alpha, ply + 1)
+            board.unmake_move()
+            if self.stopped:
+                return 0
+
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if ply == 0:
+                    self.root_move = move
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                if board.board[move[2]][move[3]] is None:
+                    self._add_killer(move, ply)
+                break
+
+        if best_score <= alpha_orig:
+            flag = UPPER
+        elif best_score >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.table.store(key, depth, _score_to_table(best_score, ply), flag, best_move)
+        return best_score
+
+    def _quiesce(self, alpha, beta, ply):
+        """駒を取る手だけを読んで局面を落ち着かせる"""
+        board = self.board
+        stand_pat = evaluate(board)
+        if stand_pat >= beta or ply >= MAX_PLY:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+
+        captures = [move for move in board.get_legal_moves()
+                    if self._is_capture(move) and move[4] in (None, PieceType.QUEEN)]
+        for move in self._order_moves(captures, None, ply):
+            self.nodes += 1
+            if self.nodes >= self.next_check:
+                self._check_limits()
+            board.make_move(*move)
+            if board.winner:
+                score = MATE - ply
+            else:
+                score = -self._quiesce(-beta, -alpha, ply + 1)
+            board.unmake_move()
+            if self.stopped:
+                return 0
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    def _is_capture(self, move):
+        """駒を取る手か（アンパッサンを含む）"""
+        board = self.board
+        if board.board[move[2]][move[3]] is not None:
+            return True
+        piece = board.board[move[0]][move[1]]
+        return piece.type == PieceType.PAWN and board.en_passant_target == (move[2], move[3])
+
+    def _order_moves(self, moves, tt_move, ply):
+        """置換表の手 → 駒取り（MVV-LVA）→ キラームーブ → その他 の順に並べる"""
+        board = self.board.board
+        killers = self.killers[ply]
+
+        def priority(move):
+            if move == tt_move:
+                return _TT_MOVE_SCORE
+            victim = board[move[2]][move[3]]
+            if victim is not None:
+                attacker = board[move[0]][move[1]]
+                if victim.type == PieceType.KING:
+                    return _TT_MOVE_SCORE - 1
+                return _CAPTURE_SCORE + MATERIAL[victim.type.value] * 16 - attacker.type.value
+            if move[4] is not None:
+                return _CAPTURE_SCORE + MATERIAL[move[4].value]
+            if move == killers[0]:
+                return _KILLER_SCORES[0]
+            if move == killers[1]:
+                return _KILLER_SCORES[1]
+            return 0
+
+        return sorted(moves, key=priority, reverse=True)
+
+    def _add_killer(self, move, ply):
+        """βカットを起こした静かな手を記録"""
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+
+    def _principal_variation(self, depth):
+        """置換表の最善手をたどって読み筋を作る"""
+        board = self.board
+        pv = []
+        for _ in range(depth):
+            entry = self.table.probe(board.zobrist_key)
+            if entry is None or entry[4] is None or entry[4] not in board.get_legal_moves():
+                break
+            pv.append(entry[4])
+            board.make_move(*entry[4])
+            if board.winner:
+                break
+        for _ in pv:
+            board.unmake_move()
+        return pv
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="局面を探索して最善手・到達深さ・nps を表示")
+    parser.add_argument("--fen", help="探索する局面（省略時は初期配置）")
+    parser.add_argument("--time", type=float, default=5.0, help="持ち時間（秒）")
+    parser.add_argument("--nodes", type=int, default=None, help="ノード数の上限")
+    parser.add_argument("--depth", type=int, default=MAX_PLY, help="深さの上限")
+    parser.add_argument("--book", help="先に引く定跡ファイル")
+    args = parser.parse_args(argv)
+
+    board = ChessBoard(args.fen)
+    book = None
+    if args.book:
+        from book import OpeningBook
+        book = OpeningBook(args.book)
+    result = Searcher(book=book).search(board, time_limit=args.time, max_nodes=args.nodes,
+                               max_depth=args.depth, callback=print)
+    if result.book:
+        print(result)  # 探索していないので深さ・ノード数は出さない
+        return 0
+    print(f"bestmove {move_name(result.move) if result.move else '(none)'} "
+          f"depth {result.depth} nodes {result.nodes} nps {result.nps:,.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,285 @@
+# ウィンドウを開かない自己対局（ChessBoard だけで指す）
+#
+# 指し手の選び方（ポリシー）同士を多数対局させ、プロセスプールに分けて並列に指す。
+# 1 局ごとの結果を JSON Lines で、集計（勝敗・終局理由・games/s・1 手あたりの
+# 思考時間のパーセンタイル）を JSON で書き出す。ルールや速度の変更の回帰確認用。
+import argparse
+import json
+import multiprocessing
+import random
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import bitboard
+import profiler
+from core import ChessBoard, PieceColor, PieceType, move_name
+from evaluation import MATERIAL
+from search import Searcher
+
+DEFAULT_MAX_PLIES = 300
+PERCENTILES = (50, 90, 99)
+
+
+class RandomPolicy:
+    """合法手から一様に選ぶ"""
+
+    def __init__(self, seed=None):
+        self.rng = random.Random(seed)
+
+    def choose(self, board):
+        return self.rng.choice(board.get_legal_moves())
+
+
+class GreedyCapturePolicy:
+    """一番価値の高い駒を、一番安い駒で取る手を選ぶ（取れなければランダム、昇格はクイーン）"""
+
+    def __init__(self, seed=None):
+        self.rng = random.Random(seed)
+
+    def choose(self, board):
+        moves = board.get_legal_moves()
+        best_score = 0
+        best = []
+        for move in moves:
+            victim = board.board[move[2]][move[3]]
+            score = 0
+            if victim is not None:
+                attacker = board.board[move[0]][move[1]]
+                score = MATERIAL[victim.type.value] * 16 - attacker.type.value
+            if move[4] == PieceType.QUEEN:
+                score += MATERIAL[bitboard.QUEEN]
+            if score > best_score:
+                best_score, best = score, [move]
+            elif score == best_score and score > 0:
+                best.append(move)
+        return self.rng.choice(best or moves)
+
+
+class SearchPolicy:
+    """Searcher で探索して選ぶ（depth・time・nodes で上限を決める。book があれば先に定跡を引く）"""
+
+    def __init__(self, seed=None, depth=2, time=None, nodes=None, book=None):
+        if book:
+            from book import OpeningBook
+            book = OpeningBook(book, seed)
+        self.searcher = Searcher(book=book)
+        self.depth = int(depth)
+        self.time_limit = float(time) if time else None
+        self.max_nodes = int(nodes) if nodes else None
+
+    def choose(self, board):
+        result = self.searcher.search(board, time_limit=self.time_limit,
+                                      max_nodes=self.max_nodes, max_depth=self.depth)
+        return result.move
+
+
+POLICIES = {
+    "random": RandomPolicy,
+    "greedy": GreedyCapturePolicy,
+    "search": SearchPolicy,
+}
+
+
+def make_policy(spec, seed=None):
+    """"名前[:キー=値,...]"（例 search:depth=3,time=0.1）からポリシーを作る"""
+    name, _, options = spec.partition(":")
+    if name not in POLICIES:
+        raise ValueError(f"Unknown policy: {name}")
+    kwargs = dict(option.split("=", 1) for option in options.split(",") if option)
+    return POLICIES[name](seed=seed, **kwargs)
+
+
+def insufficient_material(board):
+    """キングだけ、またはキングとマイナーピース 1 つだけで詰ませられないか"""
+    bbs = board.bitboards
+    others = bbs.occupied[0] & ~(bbs.pieces[bitboard.WHITE][bitboard.KING] |
+                                 bbs.pieces[bitboard.BLACK][bitboard.KING])
+    if others & (others - 1):
+        return False
+    minors = 0
+    for color in (bitboard.WHITE, bitboard.BLACK):
+        minors |= bbs.pieces[color][bitboard.BISHOP] | bbs.pieces[color][bitboard.KNIGHT]
+    return others == 0 or others == minors
+
+
+def play_game(white, black, max_plies=DEFAULT_MAX_PLIES, start_fen=None):
+    """white と black のポリシーで 1 局指し、結果の辞書を返す
+
+    latencies は手番側ごとの 1 手の思考時間（秒）のリスト。
+    """
+    board = ChessBoard(start_fen)
+    policies = {PieceColor.WHITE: white, PieceColor.BLACK: black}
+    latencies = {PieceColor.WHITE: [], PieceColor.BLACK: []}
+    moves = []
+    halfmove_clock = 0  # 50 手ルール用（ポーンを動かすか駒を取るとリセット）
+    reason = None
+    while reason is None:
+        if board.check_game_over():
+            reason = "checkmate" if board.winner else board.draw_reason
+            break
+        if len(moves) >= max_plies:
+            reason = "max plies"
+            break
+        color = board.current_turn
+        start = time.perf_counter()
+        move = policies[color].choose(board)
+        latencies[color].append(time.perf_counter() - start)
+
+        piece = board.board[move[0]][move[1]]
+        resets = piece.type == PieceType.PAWN or board.board[move[2]][move[3]] is not None
+        board.make_move(*move)
+        moves.append(move_name(move))
+        halfmove_clock = 0 if resets else halfmove_clock + 1
+        if halfmove_clock >= 100:
+            reason = "fifty-move rule"
+        elif insufficient_material(board):
+            reason = "insufficient material"
+
+    if board.winner == PieceColor.WHITE:
+        result = "1-0"
+    elif board.winner == PieceColor.BLACK:
+        result = "0-1"
+    else:
+        result = "1/2-1/2"
+    return {
+        "result": result,
+        "reason": reason,
+        "plies": len(moves),
+        "moves": moves,
+        "final_fen": board.to_fen(),
+        "latencies": {"white": latencies[PieceColor.WHITE], "black": latencies[PieceColor.BLACK]},
+    }
+
+
+def _play_batch(games, max_plies, start_fen, profile=False):
+    """ワーカー: (局番号, 白のポリシー, 黒のポリシー, 乱数の種) の列を指して
+    (結果のリスト, 計測結果または None) を返す"""
+    if profile:
+        profiler.enable().reset()
+    records = []
+    for number, white_spec, black_spec, seed in games:
+        # ポリシーは局ごとに作り直す（ワーカー数や割り振りによらず同じ棋譜になる）
+        white = make_policy(white_spec, seed)
+        black = make_policy(black_spec, seed + 1)
+        start = time.perf_counter()
+        record = play_game(white, black, max_plies, start_fen)
+        record.update(game=number, white=white_spec, black=black_spec, seed=seed,
+                      elapsed=time.perf_counter() - start)
+        records.append(record)
+    return records, profiler.PROFILER.snapshot() if profile else None
+
+
+def percentiles(values, points=PERCENTILES):
+    """最近傍順位法のパーセンタイル {"p50": ..., ...}（ミリ秒）と最大値"""
+    if not values:
+        return {}
+    values = sorted(values)
+    stats = {f"p{point}": values[max(0, -(-len(values) * point // 100) - 1)] * 1000
+             for point in points}
+    stats["max"] = values[-1] * 1000
+    return stats
+
+
+def run(policy_a, policy_b, games, workers=1, max_plies=DEFAULT_MAX_PLIES, seed=0,
+        start_fen=None, output=None, batch=8, profile=None):
+    """policy_a と policy_b を色を入れ替えながら games 局指し、集計の辞書を返す
+
+    output（ファイルオブジェクト）があれば 1 局ごとの結果を JSON Lines で書く。
+    profile（Profiler）を渡すと各ワーカーでホットパスを計測し、その結果を足し込む。
+    """
+    schedule = []
+    for number in range(games):
+        white, black = (policy_a, policy_b) if number % 2 == 0 else (policy_b, policy_a)
+        schedule.append((number, white, black, seed + number))
+    batches = [schedule[i:i + batch] for i in range(0, len(schedule), batch)]
+
+    results = Counter()
+    reasons = Counter()
+    latencies = {policy_a: [], policy_b: []}
+    plies = 0
+    start = time.perf_counter()
+
+    def collect(batch_result):
+        nonlocal plies
+        records, snapshot = batch_result
+        if snapshot:
+            profile.merge(snapshot)
+        for record in records:
+            if output:
+                output.write(json.dumps({key: value for key, value in record.items()
+                                         if key != "latencies"}) + "\n")
+            winner = {"1-0": record["white"], "0-1": record["black"]}.get(record["result"])
+            results[f"{winner} wins" if winner else "draws"] += 1
+            reasons[record["reason"]] += 1
+            plies += record["plies"]
+            latencies[record["white"]].extend(record["latencies"]["white"])
+            latencies[record["black"]].extend(record["latencies"]["black"])
+
+    if workers <= 1:
+        for games_in_batch in batches:
+            collect(_play_batch(games_in_batch, max_plies, start_fen, profile is not None))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_play_batch, games_in_batch, max_plies, start_fen,
+                                   profile is not None)
+                       for games_in_batch in batches]
+            for future in futures:
+                collect(future.result())
+    elapsed = time.perf_counter() - start
+
+    return {
+        "policies": [policy_a, policy_b],
+        "games": games,
+        "workers": workers,
+        "results": dict(results),
+        "reasons": dict(reasons),
+        "plies": plies,
+        "elapsed": elapsed,
+        "games_per_second": games / elapsed if elapsed > 0 else 0.0,
+        "moves_per_second": plies / elapsed if elapsed > 0 else 0.0,
+        "move_latency_ms": {policy: percentiles(values) for policy, values in latencies.items()},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ポリシー同士の自己対局を並列に指して集計する")
+    parser.add_argument("policy_a", help="ポリシー（random, greedy, "
+                        "search[:depth=2,time=0.1,nodes=N,book=定跡ファイル]）")
+    parser.add_argument("policy_b", help="相手のポリシー")
+    parser.add_argument("--games", type=int, default=100, help="対局数（先後を交互に入れ替える）")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(),
+                        help="対局に使うプロセス数")
+    parser.add_argument("--max-plies", type=int, default=DEFAULT_MAX_PLIES,
+                        help="この手数で打ち切って引き分けにする")
+    parser.add_argument("--seed", type=int, default=0, help="乱数の種（局ごとに seed + 局番号）")
+    parser.add_argument("--fen", help="開始局面（省略時は初期配置）")
+    parser.add_argument("-o", "--output", default="selfplay.jsonl", help="1 局ごとの結果の出力先")
+    parser.add_argument("--stats", default="selfplay_stats.json", help="集計の出力先")
+    parser.add_argument("--profile", help="ホットパスの計測結果の出力先（.json / .csv）")
+    args = parser.parse_args(argv)
+
+    for spec in (args.policy_a, args.policy_b):
+        make_policy(spec)  # 名前とオプションを先に確かめる
+    profile = profiler.Profiler() if args.profile else None
+    with open(args.output, "w", encoding="utf-8") as output:
+        stats = run(args.policy_a, args.policy_b, args.games, args.workers, args.max_plies,
+                    args.seed, args.fen, output, profile=profile)
+    with open(args.stats, "w", encoding="utf-8") as f:
+        json.dump(stats, f, indent=2)
+
+    print(f"{stats['games']} games  {stats['elapsed']:.2f}s  "
+          f"{stats['games_per_second']:,.1f} games/s  {stats['moves_per_second']:,.0f} moves/s")
+    print("results: " + "  ".join(f"{key} {value}" for key, value in stats["results"].items()))
+    print("reasons: " + "  ".join(f"{key} {value}" for key, value in stats["reasons"].items()))
+    for policy, latency in stats["move_latency_ms"].items():
+        print(f"{policy}: " + "  ".join(f"{key} {value:.2f}ms" for key, value in latency.items()))
+    if profile:
+        profile.write(args.profile)
+        print(f"profile written to {args.profile}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,345 @@
+# 複数の対局を同時に受け持つ asyncio の TCP サーバと、負荷試験用クライアント
+#
+# 1 接続が 1 局（ChessBoard 1 つ）。コマンドは 1 行 1 つで、応答も必ず 1 行
+# （"OK ..." か "ERR ..."）。手は make_move と同じ 行 列 行 列 [昇格駒] の数字で書く。
+#   NEW [FEN]             局面を初期配置（または FEN）にする
+#   MOVE fr fc tr tc [q]  手を指す。応答は "OK fr fc tr tc"、コンピュータが指せば
+#                         " | AI fr fc tr tc"、終局すれば " | END 1-0 checkmate" が続く
+#   MOVES                 合法手を "," 区切りで返す
+#   AI white|black|off [秒]  コンピュータの色と持ち時間（手番ならすぐ指す）
+#   UNDO / FEN / STATS / QUIT
+# コンピュータの探索はプロセスプールで行い、イベントループを止めない。
+import argparse
+import asyncio
+import math
+import multiprocessing
+import random
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from core import FEN_PIECES, ChessBoard, PieceColor
+from search import Searcher
+from selfplay import percentiles
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_LINE = 4096
+MAX_AI_NODES = 200000  # 1 回の探索のノード数の上限（持ち時間とは別に、ワーカーを占有させない）
+
+_PROMOTION_LETTERS = {p_type: ch for ch, p_type in FEN_PIECES.items()}
+
+# 探索プロセス側の状態（_init_worker で設定）
+_searcher = None
+
+
+def _init_worker(book_path=None):
+    global _searcher
+    book = None
+    if book_path:
+        from book import OpeningBook
+        book = OpeningBook(book_path)  # 序盤は探索せず定跡から指す
+    _searcher = Searcher(book=book)
+
+
+def _warm_up(_):
+    """プールのプロセスを起動しておくための空タスク"""
+    time.sleep(0.05)
+
+
+def _search(fen, time_limit, max_nodes):
+    """ワーカー: fen の局面の最善手を返す"""
+    return _searcher.search(ChessBoard(fen), time_limit=time_limit, max_nodes=max_nodes).move
+
+
+def format_move(move):
+    """手を "fr fc tr tc [昇格駒]" の文字列にする"""
+    text = " ".join(str(value) for value in move[:4])
+    if move[4]:
+        text += " " + _PROMOTION_LETTERS[move[4]]
+    return text
+
+
+def parse_move(tokens):
+    """["6", "4", "4", "4", ("q")] を手のタプルにする（おかしければ ValueError）"""
+    if len(tokens) not in (4, 5):
+        raise ValueError("expected: MOVE from_row from_col to_row to_col [q|r|b|n]")
+    coords = [int(token) for token in tokens[:4]]
+    if not all(0 <= value < 8 for value in coords):
+        raise ValueError("coordinates must be 0-7")
+    promotion = None
+    if len(tokens) == 5:
+        promotion = FEN_PIECES.get(tokens[4].lower())
+        if promotion is None or tokens[4].lower() in "kp":
+            raise ValueError("promotion must be q, r, b or n")
+    return (*coords, promotion)
+
+
+def result_text(board):
+    """終局していれば "END 結果 理由" を返す（続いていれば None）"""
+    if not board.check_game_over():
+        return None
+    if board.winner == PieceColor.WHITE:
+        return "END 1-0 checkmate"
+    if board.winner == PieceColor.BLACK:
+        return "END 0-1 checkmate"
+    return f"END 1/2-1/2 {board.draw_reason}"
+
+
+class Session:
+    """1 接続分の対局"""
+
+    def __init__(self):
+        self.board = ChessBoard()
+        self.ai_color = None
+        self.ai_time = 0.1
+
+
+class ChessServer:
+    """接続ごとに Session を持ち、コマンドを 1 行ずつ処理する"""
+
+    def __init__(self, ai_workers=1, max_ai_time=5.0, book=None, max_ai_nodes=MAX_AI_NODES):
+        # 待ち受けソケットを子プロセスに持たせないよう、先にワーカーを起動しておく
+        self.executor = ProcessPoolExecutor(max_workers=ai_workers, initializer=_init_worker,
+                                            initargs=(book,))
+        list(self.executor.map(_warm_up, range(ai_workers)))
+        self.max_ai_time = max_ai_time
+        self.max_ai_nodes = max_ai_nodes
+        self.sessions = 0
+        self.total_sessions = 0
+        self.commands = 0
+        self.server = None
+        self.handlers = set()  # 接続ごとの handle のタスク（終了時に取り消す）
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self.server = await asyncio.start_server(self.handle, host, port, backlog=4096,
+                                                 limit=MAX_LINE)
+        return self.server
+
+    async def close(self):
+        """待ち受けをやめ、接続中の handle を取り消して終わるのを待ち、ワーカーを止める"""
+        if self.server:
+            self.server.close()
+        handlers = list(self.handlers)
+        for task in handlers:
+            task.cancel()
+        await asyncio.gather(*handlers, return_exceptions=True)
+        self.executor.shutdown(cancel_futures=True)
+
+    async def handle(self, reader, writer):
+        """1 接続を処理する（QUIT か切断まで）"""
+        session = Session()
+        task = asyncio.current_task()
+        self.handlers.add(task)
+        self.sessions += 1
+        self.total_sessions += 1
+        try:
+            writer.write(b"OK chess server\n")
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, asyncio.LimitOverrunError):
+                    writer.write(b"ERR line too long\n")
+                    break
+                if not line:
+                    break
+                command, _, rest = line.decode("utf-8", "replace").strip().partition(" ")
+                if command.upper() == "QUIT":
+                    writer.write(b"OK bye\n")
+                    break
+                self.commands += 1
+                try:
+                    response = await self.dispatch(session, command.upper(), rest.split())
+                except ValueError as error:
+                    response = f"ERR {error}"
+                writer.write(response.encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        except asyncio.CancelledError:
+            # close() で取り消された。そのまま返して正常に終えたことにする
+            # （取り消されたまま終わると asyncio がトレースバックを出す）
+            pass
+        finally:
+            self.handlers.discard(task)
+            self.sessions -= 1
+            writer.close()
+
+    async def dispatch(self, session, command, args):
+        """コマンド 1 つを実行し、応答の行を返す"""
+        board = session.board
+        if command == "NEW":
+            try:
+                session.board = ChessBoard(" ".join(args) if args else None)
+            except (KeyError, IndexError, ValueError):
+                raise ValueError("bad FEN")
+            return "OK" + await self.ai_reply(session)
+        if command == "MOVE":
+            move = parse_move(args)
+            if board.game_over:
+                raise ValueError("game is over")
+            if session.ai_color == board.current_turn:
+                raise ValueError("not your turn")
+            if move not in board.get_legal_moves():
+                raise ValueError("illegal move")
+            board.make_move(*move)
+            end = result_text(board)
+            if end:
+                return f"OK {format_move(move)} | {end}"
+            return f"OK {format_move(move)}" + await self.ai_reply(session)
+        if command == "MOVES":
+            return "OK " + ",".join(format_move(move) for move in board.get_legal_moves())
+        if command == "AI":
+            if not args or args[0].lower() not in ("white", "black", "off"):
+                raise ValueError("expected: AI white|black|off [seconds]")
+            if len(args) > 1:
+                try:
+                    ai_time = float(args[1])
+                except ValueError:
+                    ai_time = math.nan
+                if not (math.isfinite(ai_time) and ai_time > 0):
+                    raise ValueError("seconds must be a positive number")
+                session.ai_time = min(ai_time, self.max_ai_time)
+            session.ai_color = None if args[0].lower() == "off" else PieceColor[args[0].upper()]
+            return "OK" + await self.ai_reply(session)
+        if command == "UNDO":
+            if not board.unmake_move():
+                raise ValueError("nothing to undo")
+            # コンピュータと対局中は、コンピュータの手もまとめて戻して自分の番にする
+            if session.ai_color == board.current_turn and board.undo_stack:
+                board.unmake_move()
+            # コンピュータの最初の手を戻したときは、コンピュータがもう一度指す
+            return "OK" + await self.ai_reply(session)
+        if command == "FEN":
+            return "OK " + board.to_fen()
+        if command == "STATS":
+            return f"OK sessions {self.sessions} total {self.total_sessions} commands {self.commands}"
+        raise ValueError(f"unknown command {command!r}")
+
+    async def ai_reply(self, session):
+        """コンピュータの番なら探索を別プロセスで行って指し、応答に足す文字列を返す"""
+        board = session.board
+        if session.ai_color != board.current_turn or board.game_over:
+            return ""
+        loop = asyncio.get_running_loop()
+        move = await loop.run_in_executor(self.executor, _search, board.to_fen(), session.ai_time,
+                                          self.max_ai_nodes)
+        if move is None:
+            return ""
+        board.make_move(*move)
+        end = result_text(board)
+        return f" | AI {format_move(move)}" + (f" | {end}" if end else "")
+
+
+async def serve(host, port, ai_workers, book=None, max_ai_nodes=MAX_AI_NODES):
+    """Ctrl+C か SIGTERM を受けるまでサーバを動かす"""
+    server = ChessServer(ai_workers, book=book, max_ai_nodes=max_ai_nodes)
+    listener = await server.start(host, port)
+    # 終了のシグナルはイベントループで受け、探索のワーカーも止めてから終わる。
+    # Windows のイベントループはシグナルを受けられないので、Ctrl+C（KeyboardInterrupt で
+    # このタスクが取り消される）のときも finally で同じように止める
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, AttributeError, ValueError):
+            break
+    print(f"listening on {host}:{port} ({ai_workers} AI workers)")
+    try:
+        async with listener:
+            await stop.wait()
+    finally:
+        await server.close()
+
+
+async def _player(host, port, moves, ai_time, rng, latencies, counts):
+    """負荷試験の 1 プレイヤー: 合法手を取得してランダムに指すことを繰り返す"""
+    reader, writer = await asyncio.open_connection(host, port, limit=1 << 16)
+    await reader.readline()
+
+    async def request(line):
+        start = time.perf_counter()
+        writer.write(line.encode() + b"\n")
+        await writer.drain()
+        response = (await reader.readline()).decode().strip()
+        latencies.append(time.perf_counter() - start)
+        counts["requests"] += 1
+        if response.startswith("ERR"):
+            counts["errors"] += 1
+        return response
+
+    if ai_time:
+        await request(f"AI black {ai_time}")
+    for _ in range(moves):
+        legal = (await request("MOVES"))[3:]
+        if not legal:
+            await request("NEW")
+            counts["games"] += 1
+            continue
+        response = await request("MOVE " + rng.choice(legal.split(",")))
+        if "| END" in response:
+            await request("NEW")
+            counts["games"] += 1
+    await request("QUIT")
+    writer.close()
+
+
+async def load_test(host, port, clients, moves, ai_time=None, seed=0):
+    """clients 人のプレイヤーを同時に動かし、スループットと応答時間を表示する"""
+    latencies = []
+    counts = {"requests": 0, "errors": 0, "games": 0}
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(_player(host, port, moves, ai_time, random.Random(rng.random()), latencies, counts)
+          for _ in range(clients)),
+        return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    failed = [result for result in results if isinstance(result, Exception)]
+    stats = percentiles(latencies)
+    print(f"{clients} clients  {counts['requests']} requests  {counts['errors']} errors  "
+          f"{len(failed)} failed connections  {elapsed:.2f}s  "
+          f"{counts['requests'] / elapsed:,.0f} requests/s")
+    print("latency: " + "  ".join(f"{key} {value:.2f}ms" for key, value in stats.items()))
+    if failed:
+        print(f"first failure: {failed[0]!r}")
+    return counts, stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="対局サーバと負荷試験クライアント")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("serve", help="サーバを起動する")
+    run.add_argument("--host", default=DEFAULT_HOST)
+    run.add_argument("--port", type=int, default=DEFAULT_PORT)
+    run.add_argument("--ai-workers", type=int, default=multiprocessing.cpu_count(),
+                     help="コンピュータの探索に使うプロセス数")
+    run.add_argument("--book", help="コンピュータが序盤に使う定跡ファイル")
+    run.add_argument("--max-ai-nodes", type=int, default=MAX_AI_NODES,
+                     help="コンピュータの 1 回の探索のノード数の上限")
+    load = sub.add_parser("loadtest", help="ランダムに指すプレイヤーを同時に接続する")
+    load.add_argument("--host", default=DEFAULT_HOST)
+    load.add_argument("--port", type=int, default=DEFAULT_PORT)
+    load.add_argument("--clients", type=int, default=100, help="同時に接続するプレイヤー数")
+    load.add_argument("--moves", type=int, default=50, help="1 プレイヤーが指す手数")
+    load.add_argument("--ai-time", type=float, default=None,
+                      help="指定するとコンピュータ（黒）と対局する（持ち時間・秒）")
+    load.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "serve":
+            asyncio.run(serve(args.host, args.port, args.ai_workers, args.book,
+                              args.max_ai_nodes))
+        else:
+            asyncio.run(load_test(args.host, args.port, args.clients, args.moves, args.ai_time,
+                                  args.seed))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
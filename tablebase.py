@@ -0,0 +1,372 @@
+# 駒の少ない終盤（KQK・KRK・KPK）の後退解析テーブル
+#
+# 強い側を白に揃えた局面を 手番(2) × 白キング(64) × 黒キング(64) × 白の駒(64) で番号付けし、
+# 各局面の値を 1 バイトで持つ（手番側から見た値）:
+#   0 = 引き分け、奇数 n = n 手（プライ）で勝ち、偶数 n >= 2 = n - 2 手で負け（2 は詰み）、
+#   255 = あり得ない局面
+# 作るときは全局面の指し手を (元, 先) の番号の組として NumPy 配列に並べ、「負けの局面へ
+# 行ける手がある」「全ての手が勝ちの局面へ行く」をプライごとに配列演算でまとめて求める。
+# 引くときは mmap したファイルの 1 バイトを読むだけなので NumPy は要らない。
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+
+import bitboard
+from core import ChessBoard, move_name
+
+MAGIC = b"CHTB"
+VERSION = 1
+DEFAULT_DIR = "tablebases"
+
+# 作れる駒の組（白の駒種）。KPK の昇格先の値を使うので KQK・KRK を先に作る
+TABLES = {"KQK": bitboard.QUEEN, "KRK": bitboard.ROOK, "KPK": bitboard.PAWN}
+
+DRAW = 0
+INVALID = 255
+WIN, LOSS = 1, -1
+
+_HEADER = struct.Struct("<4sHH")
+_HALF = 64 * 64 * 64  # 手番ごとの局面数
+_SIZE = 2 * _HALF
+
+
+def index(white_to_move, wk, bk, sq):
+    """局面の番号（強い側を白に揃えたマス番号で指定）"""
+    return (0 if white_to_move else _HALF) + (wk << 12 | bk << 6 | sq)
+
+
+def encode(wdl, plies):
+    """(勝敗, プライ数) を 1 バイトの値にする"""
+    if wdl == WIN:
+        return plies
+    if wdl == LOSS:
+        return plies + 2
+    return DRAW
+
+
+def decode(value):
+    """1 バイトの値を (勝敗, プライ数) にする（あり得ない局面は None）"""
+    if value == INVALID:
+        return None
+    if value == DRAW:
+        return 0, 0
+    if value & 1:
+        return WIN, value
+    return LOSS, value - 2
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise SystemExit("tablebase generation needs NumPy (pip install numpy)")
+    return numpy
+
+
+def _square_tables(np, ptype):
+    """マス同士の関係の表: キングの隣接、駒の利き（空の盤）、間のマス、キングの行き先"""
+    adjacent = np.zeros((64, 64), dtype=bool)
+    attack = np.zeros((64, 64), dtype=bool)
+    between = np.zeros((64, 64, 64), dtype=bool)
+    king_dest = np.full((64, 8), -1, dtype=np.int64)
+    rays = {bitboard.QUEEN: bitboard.QUEEN_RAYS, bitboard.ROOK: bitboard.ROOK_RAYS}.get(ptype)
+    for sq in range(64):
+        adjacent[sq, bitboard.squares_of(bitboard.KING_ATTACKS[sq])] = True
+        adjacent[sq, sq] = True
+        if rays:
+            targets = bitboard.slider_targets(sq, rays, 0)
+        else:
+            targets = bitboard.PAWN_ATTACKS[bitboard.WHITE][sq]
+        attack[sq, bitboard.squares_of(targets)] = True
+        for to in range(64):
+            between[sq, to, bitboard.squares_of(bitboard.BETWEEN[sq][to])] = True
+        for k, dest in enumerate(bitboard.squares_of(bitboard.KING_ATTACKS[sq])):
+            king_dest[sq, k] = dest
+    return adjacent, attack, between, king_dest
+
+
+def solve(ptype, promotions=None):
+    """白キング + ptype 対 黒キングの全局面を解き、値の配列（uint8, 長さ 2 × 64^3）を返す
+
+    promotions は KPK の昇格先の表 {駒種: 値の配列}（KQK・KRK を解いたもの）。
+    """
+    np = _numpy()
+    adjacent, attack, between, king_dest = _square_tables(np, ptype)
+    half = np.arange(_HALF)
+    wk, bk, sq = half >> 12, half >> 6 & 63, half & 63
+
+    # あり得る局面: 3 つのマスが別、キングが隣り合わない、ポーンは 1・8 段目にいない
+    valid = (wk != bk) & (wk != sq) & (bk != sq) & ~adjacent[wk, bk]
+    if ptype == bitboard.PAWN:
+        row = sq >> 3
+        valid &= (row != 0) & (row != 7)
+    checked = attack[sq, bk] & ~between[sq, bk, wk]  # 黒キングが白の駒に王手されている
+    valid_white = valid & ~checked  # 白番で黒が王手されている局面はあり得ない
+    valid_black = valid
+
+    # 白の手（元は白番の局面、先は黒番の局面。昇格先は他の表の番号に足し込む）
+    sentinel = _SIZE  # 黒が白の駒を取って引き分けになる先
+    external = [np.array([DRAW], dtype=np.uint8)]
+    offsets = {}
+    if promotions:
+        base = _SIZE + 1
+        for promoted, table in promotions.items():
+            offsets[promoted] = base
+            external.append(table)
+            base += len(table)
+
+    white_src, white_dst = [], []
+    for k in range(8):
+        dest = king_dest[wk, k]
+        ok = valid_white & (dest >= 0) & (dest != sq) & ~adjacent[np.maximum(dest, 0), bk]
+        white_src.append(half[ok])
+        white_dst.append(_HALF + (dest[ok] << 12 | bk[ok] << 6 | sq[ok]))
+    if ptype == bitboard.PAWN:
+        single = sq - 8
+        empty = (single != wk) & (single != bk)
+        double = sq - 16
+        pushes = [(valid_white & empty, single),
+                  (valid_white & empty & (sq >> 3 == 6) & (double != wk) & (double != bk), double)]
+        for ok, dest in pushes:
+            promote = ok & (dest >> 3 == 0)
+            ok = ok & ~promote
+            white_src.append(half[ok])
+            white_dst.append(_HALF + (wk[ok] << 12 | bk[ok] << 6 | dest[ok]))
+            for base in offsets.values():
+                white_src.append(half[promote])
+                white_dst.append(base + _HALF + (wk[promote] << 12 | bk[promote] << 6 |
+                                                 dest[promote]))
+    else:
+        for to in range(64):
+            ok = (valid_white & attack[sq, to] & (wk != to) & (bk != to) &
+                  ~between[sq, to, wk] & ~between[sq, to, bk])
+            white_src.append(half[ok])
+            white_dst.append(_HALF + (wk[ok] << 12 | bk[ok] << 6 | to))
+    white_src = np.concatenate(white_src)
+    white_dst = np.concatenate(white_dst)
+
+    # 黒の手（元は黒番、先は白番。白の駒を取ると引き分け）
+    black_src, black_dst = [], []
+    for k in range(8):
+        dest = king_dest[bk, k]
+        safe = np.maximum(dest, 0)
+        ok = valid_black & (dest >= 0) & ~adjacent[safe, wk]
+        capture = ok & (safe == sq)
+        # 元の黒キングのマスは塞がないので、白の駒の利きは白キングだけで遮られる
+        ok &= (safe != sq) & ~(attack[sq, safe] & ~between[sq, safe, wk])
+        black_src.append(_HALF + half[ok])
+        black_dst.append(wk[ok] << 12 | dest[ok] << 6 | sq[ok])
+        black_src.append(_HALF + half[capture])
+        black_dst.append(np.full(int(capture.sum()), sentinel))
+    black_src = np.concatenate(black_src)
+    black_dst = np.concatenate(black_dst)
+    black_moves = np.bincount(black_src, minlength=_SIZE)
+
+    # 値の作業用配列（wdl: 0 未決定 / 1 勝ち / -1 負け / 2 引き分け確定 / 3 あり得ない）
+    wdl = np.zeros(_SIZE, dtype=np.int8)
+    plies = np.zeros(_SIZE, dtype=np.int16)
+    wdl[:_HALF][~valid_white] = 3
+    wdl[_HALF:][~valid_black] = 3
+    no_moves = valid_black & (black_moves[_HALF:] == 0)
+    wdl[_HALF:][no_moves & checked] = LOSS  # チェックメイト
+    wdl[_HALF:][no_moves & ~checked] = 2  # ステイルメイト
+
+    ext_wdl = np.concatenate([_decode_wdl(np, table) for table in external])
+    ext_plies = np.concatenate([_decode_plies(np, table) for table in external])
+    longest = int(ext_plies.max()) if len(ext_plies) else 0
+
+    n = 0
+    last_change = 0
+    while n <= longest + 2 or n - last_change <= 2:
+        n += 1
+        all_wdl = np.concatenate([wdl, ext_wdl])
+        all_plies = np.concatenate([plies, ext_plies])
+        if n & 1:
+            # 白番: 負け（n - 1 手）の黒番局面へ行ける手があれば n 手で勝ち
+            hit = (all_wdl[white_dst] == LOSS) & (all_plies[white_dst] == n - 1)
+            new = np.unique(white_src[hit])
+            new = new[wdl[new] == 0]
+            wdl[new] = WIN
+        else:
+            # 黒番: 全ての手が白の勝ちの局面へ行くなら n 手で負け
+            won = np.bincount(black_src[all_wdl[black_dst] == WIN], minlength=_SIZE)
+            new = np.flatnonzero((wdl == 0) & (black_moves > 0) & (won == black_moves))
+            wdl[new] = LOSS
+        plies[new] = n
+        if len(new):
+            last_change = n
+
+    values = np.zeros(_SIZE, dtype=np.uint8)
+    values[wdl == WIN] = plies[wdl == WIN]
+    values[wdl == LOSS] = plies[wdl == LOSS] + 2
+    values[wdl == 3] = INVALID
+    return values
+
+
+def _decode_wdl(np, values):
+    """値の配列から作業用の wdl 配列を作る（引き分けとあり得ない局面は確定扱い）"""
+    wdl = np.full(len(values), 2, dtype=np.int8)
+    decided = (values != DRAW) & (values != INVALID)
+    wdl[decided & (values & 1 == 1)] = WIN
+    wdl[decided & (values & 1 == 0)] = LOSS
+    return wdl
+
+
+def _decode_plies(np, values):
+    """値の配列からプライ数の配列を作る"""
+    plies = values.astype(np.int16)
+    plies[(values & 1 == 0) & (values != DRAW)] -= 2
+    plies[(values == DRAW) | (values == INVALID)] = 0
+    return plies
+
+
+def generate(directory=DEFAULT_DIR, names=None):
+    """表を作って directory に書き出す（KPK には KQK・KRK が要るので、なければ一緒に作る）"""
+    np = _numpy()
+    os.makedirs(directory, exist_ok=True)
+    names = set(names or TABLES)
+    if "KPK" in names:
+        names |= {name for name in ("KQK", "KRK") if not os.path.exists(_path(directory, name))}
+
+    solved = {}
+
+    def table(name):
+        if name not in solved:
+            with open(_path(directory, name), "rb") as f:
+                f.seek(_HEADER.size)
+                solved[name] = np.frombuffer(f.read(), dtype=np.uint8)
+        return solved[name]
+
+    for name, ptype in TABLES.items():
+        if name not in names:
+            continue
+        start = time.perf_counter()
+        promotions = None
+        if ptype == bitboard.PAWN:
+            promotions = {bitboard.QUEEN: table("KQK"), bitboard.ROOK: table("KRK")}
+        values = solve(ptype, promotions)
+        solved[name] = values
+        with open(_path(directory, name), "wb") as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, ptype))
+            f.write(values.tobytes())
+        wins = values[(values != INVALID) & (values & 1 == 1)]
+        print(f"{name}: {len(wins)} wins  longest {int(wins.max())} plies  "
+              f"{time.perf_counter() - start:.1f}s")
+
+
+def _path(directory, name):
+    return os.path.join(directory, f"{name}.tb")
+
+
+class Tablebase:
+    """作った表で ChessBoard の局面を引く（表は使うときに mmap する）"""
+
+    def __init__(self, directory=DEFAULT_DIR):
+        self.directory = directory
+        self.tables = {}
+
+    def _table(self, ptype):
+        if ptype not in self.tables:
+            name = next(name for name, value in TABLES.items() if value == ptype)
+            path = _path(self.directory, name)
+            if not os.path.exists(path):
+                self.tables[ptype] = None
+            else:
+                with open(path, "rb") as f:
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                magic, version, stored = _HEADER.unpack_from(data, 0)
+                if magic != MAGIC or version != VERSION or stored != ptype:
+                    raise ValueError(f"Not a {name} tablebase: {path}")
+                self.tables[ptype] = data
+        return self.tables[ptype]
+
+    def probe(self, board):
+        """手番側から見た (勝敗, プライ数) を返す。表にない局面は None
+
+        勝敗は WIN / LOSS / 0（引き分け）。キングとマイナーピース 1 つだけなら引き分け。
+        """
+        bbs = board.bitboards
+        if bbs.castling_rights() or board.promotion_pending or board.game_over:
+            return None
+        occupied = bbs.occupied[0]
+        count = bin(occupied).count("1")
+        if count == 2:
+            return 0, 0
+        if count != 3:
+            return None
+        strong = bitboard.WHITE if bin(bbs.occupied[bitboard.WHITE]).count("1") == 2 else bitboard.BLACK
+        pieces = bbs.pieces[strong]
+        ptype = next(p for p in range(bitboard.PAWN, bitboard.KING) if pieces[p])
+        if ptype in (bitboard.BISHOP, bitboard.KNIGHT):
+            return 0, 0
+        table = self._table(ptype)
+        if table is None:
+            return None
+
+        wk = pieces[bitboard.KING].bit_length() - 1
+        sq = pieces[ptype].bit_length() - 1
+        bk = bbs.pieces[bitboard.other(strong)][bitboard.KING].bit_length() - 1
+        white_to_move = board.current_turn.value == strong
+        if strong == bitboard.BLACK:  # 上下を反転して白を強い側にする
+            wk, bk, sq = wk ^ 56, bk ^ 56, sq ^ 56
+        return decode(table[_HEADER.size + index(white_to_move, wk, bk, sq)])
+
+    def best_move(self, board):
+        """表で最善の手（勝ちなら最短、負けなら最長の手順、引き分けなら引き分けを保つ手）を返す
+
+        表にない局面は None。
+        """
+        if self.probe(board) is None:
+            return None
+        best = None
+        best_key = None
+        for move in board.get_legal_moves():
+            board.make_move(*move)
+            after = self.probe(board)
+            board.unmake_move()
+            if after is None:
+                continue
+            wdl, plies = after
+            # 相手から見て負けの手（短いほど良い）> 引き分け > 勝ち（長いほど良い）
+            key = (-wdl, -plies if wdl == LOSS else plies)
+            if best_key is None or key > best_key:
+                best, best_key = move, key
+        return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="終盤テーブルの作成と確認")
+    sub = parser.add_subparsers(dest="command", required=True)
+    make = sub.add_parser("generate", help="後退解析で表を作る（NumPy が必要）")
+    make.add_argument("names", nargs="*", help=f"作る表 {' '.join(TABLES)}（省略時は全て）")
+    make.add_argument("--dir", default=DEFAULT_DIR, help="出力先のディレクトリ")
+    show = sub.add_parser("probe", help="局面の値と最善手を表示")
+    show.add_argument("fen")
+    show.add_argument("--dir", default=DEFAULT_DIR, help="表のディレクトリ")
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        unknown = set(args.names) - set(TABLES)
+        if unknown:
+            parser.error(f"unknown table: {' '.join(sorted(unknown))}")
+        generate(args.dir, args.names)
+        return 0
+
+    tablebase = Tablebase(args.dir)
+    board = ChessBoard(args.fen)
+    value = tablebase.probe(board)
+    if value is None:
+        print("not in tablebase")
+        return 1
+    wdl, plies = value
+    text = {WIN: f"win in {plies} plies", LOSS: f"loss in {plies} plies", 0: "draw"}[wdl]
+    move = tablebase.best_move(board)
+    print(f"{text}  best {move_name(move) if move else '-'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+# Zobrist ハッシュ用の乱数表と、固定サイズの置換表
+import random
+
+_rng = random.Random(0x5EED)  # 実行ごとに同じキーになるよう固定シード
+
+
+def _rand64():
+    return _rng.getrandbits(64)
+
+
+# PIECE_KEYS[色][駒種][マス]（色・駒種は PieceColor / PieceType の value、0 は未使用）
+PIECE_KEYS = [[[_rand64() for _ in range(64)] for _ in range(7)] for _ in range(3)]
+SIDE_KEY = _rand64()  # 黒番のとき XOR する
+EP_KEYS = [_rand64() for _ in range(64)]  # アンパッサンの対象マス
+CASTLING_KEYS = [_rand64() for _ in range(16)]  # キャスリング権 4 ビットの組み合わせ
+CASTLING_KEYS[0] = 0  # 権利なしは 0 にしておく
+
+# 置換表のエントリ種別
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+class TranspositionTable:
+    """局面キーをインデックスにした固定サイズの置換表
+
+    エントリは (key, depth, score, flag, move, generation) のタプル。
+    同じスロットに別局面が来たときは、前回以前の探索のエントリか、
+    深さが同じか深い結果なら置き換える（深さ優先 + 世代による置き換え）。
+    """
+
+    def __init__(self, size=1 << 18):
+        # スロット数は 2 のべき乗に切り上げる
+        self.size = 1 << max(0, size - 1).bit_length()
+        self.mask = self.size - 1
+        self.slots = [None] * self.size
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.replacements = 0
+
+    def probe(self, key):
+        """キーに一致するエントリを返す。なければ None"""
+        entry = self.slots[key & self.mask]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, score, flag=EXACT, move=None):
+        """結果を保存（置き換え方針に合わなければ捨てる）"""
+        index = key & self.mask
+        old = self.slots[index]
+        if old is not None and old[0] != key:
+            if old[5] == self.generation and old[1] > depth:
+                return False  # 今回の探索のより深い結果を残す
+            self.replacements += 1
+        elif old is not None and move is None:
+            move = old[4]  # 同じ局面なら最善手は引き継ぐ
+        self.slots[index] = (key, depth, score, flag, move, self.generation)
+        self.stores += 1
+        return True
+
+    def new_search(self):
+        """探索の区切り。古い世代のエントリは優先的に置き換えられる"""
+        self.generation += 1
+
+    def clear(self):
+        """全エントリと統計を消去"""
+        self.slots = [None] * self.size
+        self.generation = 0
+        self.hits = self.misses = self.stores = self.replacements = 0
+
+    def hit_rate(self):
+        """probe のうちヒットした割合"""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        """統計情報の辞書"""
+        used = sum(1 for entry in self.slots if entry is not None)
+        return {
+            "size": self.size,
+            "used": used,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate(),
+            "stores": self.stores,
+            "replacements": self.replacements,
+        }